@@ -1,11 +1,14 @@
 import argparse
+import http.client
+import mmap
 import os
-import re
 import sys
+import struct
+import threading
 import time
-from urllib.parse import urlencode
-from urllib.request import urlopen, Request
-import json
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode, urlsplit
 import shutil
 
 # Ensure workspace root is importable before importing our local 'shared' package
@@ -14,10 +17,20 @@ _WORKSPACE_ROOT = os.path.dirname(_THIS_DIR)
 if _WORKSPACE_ROOT not in sys.path:
     sys.path.insert(0, _WORKSPACE_ROOT)
 
-from shared import crypto_tools
+from shared import compress_tools, crypto_tools, json_tools
 
 
-ALNUM_RE = re.compile(r"^[A-Za-z0-9]+$")
+_DATA_DIR = os.path.join(_THIS_DIR, "data")
+_DATASET_DIRS: dict[tuple[str, str], str] = {}
+
+
+def _dataset_dir(label: str, data_name: str) -> str:
+    """Return client/data/<label>/<data_name>, memoised per dataset."""
+    key = (label, data_name)
+    path = _DATASET_DIRS.get(key)
+    if path is None:
+        path = _DATASET_DIRS[key] = os.path.join(_DATA_DIR, label, data_name)
+    return path
 
 
 def _normalize_server(server: str) -> tuple[str, int, str]:
@@ -33,20 +46,28 @@ def _normalize_server(server: str) -> tuple[str, int, str]:
 
 
 def _latest_hash_from_file(path: str) -> str | None:
-    if not os.path.exists(path):
-        return None
+    # Read only the end of the file, doubling the window backwards until a
+    # non-empty line is found (or the whole file has been read).
     last = None
     try:
-        with open(path, "r", encoding="utf-8") as f:
-            for line in f:
-                line = line.strip()
-                if not line:
-                    continue
-                last = line
+        with open(path, "rb") as f:
+            size = f.seek(0, os.SEEK_END)
+            window = 4096
+            while True:
+                start = max(0, size - window)
+                f.seek(start)
+                lines = f.read(size - start).split(b"\n")
+                if start > 0:
+                    lines = lines[1:]  # first piece may be a partial line
+                last = next((ln.strip() for ln in reversed(lines) if ln.strip()), None)
+                if last is not None or start == 0:
+                    break
+                window *= 2
     except OSError:
         return None
     if not last:
         return None
+    last = last.decode("utf-8", "replace")
     parts = last.split()
     if len(parts) >= 3:
         # Format: EVENT OPRF_HEX ENC_META HASH
@@ -57,55 +78,493 @@ def _latest_hash_from_file(path: str) -> str | None:
     return None
 
 
+# Keep-alive connections reused across requests to the same server, so the
+# /sync_data, /encryption_type and /oprf_evaluate calls of one query share a
+# socket instead of paying a TCP handshake each.
+_HTTP_TIMEOUT = 30.0
+_POOL_MAXSIZE = 4
+_POOL: dict[tuple[str, int], list[http.client.HTTPConnection]] = {}
+_POOL_LOCK = threading.Lock()
+
+
+def _http_request(url: str, method: str = "GET", body: bytes | None = None, headers: dict | None = None) -> tuple[int, http.client.HTTPMessage, bytes]:
+    """Issue a request over a pooled connection; return (status, headers, body).
+
+    A connection taken from the pool may have been closed by the server while
+    idle; in that case the request is retried once on a fresh connection.
+    """
+    parts = urlsplit(url)
+    key = (parts.hostname or "", parts.port or 80)
+    target = (parts.path or "/") + (f"?{parts.query}" if parts.query else "")
+    for _ in range(2):
+        with _POOL_LOCK:
+            idle = _POOL.get(key)
+            conn = idle.pop() if idle else None
+        reused = conn is not None
+        if conn is None:
+            conn = http.client.HTTPConnection(key[0], key[1], timeout=_HTTP_TIMEOUT)
+        try:
+            conn.request(method, target, body=body, headers=headers or {})
+            resp = conn.getresponse()
+            data = resp.read()
+        except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+            conn.close()
+            if reused:
+                continue
+            raise
+        except Exception:
+            conn.close()
+            raise
+        if resp.will_close:
+            conn.close()
+        else:
+            with _POOL_LOCK:
+                idle = _POOL.setdefault(key, [])
+                if len(idle) < _POOL_MAXSIZE:
+                    idle.append(conn)
+                    conn = None
+            if conn is not None:
+                conn.close()
+        return resp.status, resp.headers, data
+    raise ConnectionError(f"Connection to {key[0]}:{key[1]} closed by server")
+
+
 def _http_get_json(url: str) -> dict:
-    req = Request(url, headers={"Accept": "application/json"})
-    with urlopen(req) as resp:
-        data = resp.read()
-        if resp.status != 200:
-            raise RuntimeError(f"HTTP {resp.status}: {data.decode('utf-8', 'ignore')}")
-        return json.loads(data.decode("utf-8"))
+    status, _, data = _http_request(url, headers={"Accept": "application/json"})
+    if status != 200:
+        raise RuntimeError(f"HTTP {status}: {data.decode('utf-8', 'ignore')}")
+    return json_tools.loads(data)
 
 
 def _http_post_json(url: str, payload: dict) -> dict:
-    body = json.dumps(payload).encode("utf-8")
-    req = Request(url, data=body, headers={"Content-Type": "application/json", "Accept": "application/json"}, method="POST")
-    with urlopen(req) as resp:
-        data = resp.read()
-        if resp.status != 200:
-            raise RuntimeError(f"HTTP {resp.status}: {data.decode('utf-8', 'ignore')}")
-        return json.loads(data.decode("utf-8"))
+    body = json_tools.dumps(payload)
+    status, _, data = _http_request(
+        url, method="POST", body=body, headers={"Content-Type": "application/json", "Accept": "application/json"}
+    )
+    if status != 200:
+        raise RuntimeError(f"HTTP {status}: {data.decode('utf-8', 'ignore')}")
+    return json_tools.loads(data)
 
 
-def _load_local_changes_log(base_dir: str, label: str, data_name: str) -> list[str]:
-    path = os.path.join(base_dir, "data", label, data_name, "changes.log")
+def _load_local_changes_log(label: str, data_name: str) -> list[str]:
+    path = os.path.join(_dataset_dir(label, data_name), "changes.log")
     if not os.path.exists(path):
         raise FileNotFoundError(f"Local changes.log not found at {path}. Run 'sync_data' first.")
-    with open(path, "r", encoding="utf-8") as f:
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
         return f.readlines()
 
 
-def _load_active_index(base_dir: str, label: str, data_name: str) -> dict[str, str]:
-    out_dir = os.path.join(base_dir, "data", label, data_name)
-    path = os.path.join(out_dir, "active_index.csv")
-    mapping: dict[str, str] = {}
-    if not os.path.exists(path):
-        return mapping
+# active_index.bin holds the active set sorted by raw PRF so a query is a
+# binary search over an mmap instead of parsing the whole index. Layout
+# (little-endian):
+#   magic(8) | N: u64 | M: u64 | N x 64-byte PRF, ascending
+#   | (N+1) x u64 offsets | blob | M-byte Bloom filter
+# where entry i's enc_meta ("NONCE_HEX:CT_HEX", ASCII) is blob[off[i]:off[i+1]].
+# PRFs are uniformly random, so the filter uses the first _BLOOM_K u32 words
+# of each PRF directly as its bit positions; most misses are rejected there
+# without touching the PRF table. Version 1 files (no M, no filter) are still
+# read.
+_ACTIVE_MAGIC = b"CMAIDX2\0"
+_ACTIVE_MAGIC_V1 = b"CMAIDX1\0"
+_ACTIVE_HEADER = struct.Struct("<8sQQ")
+_ACTIVE_HEADER_V1 = struct.Struct("<8sQ")
+_PRF_LEN = 64
+_BLOOM_K = 4
+_BLOOM_BITS_PER_KEY = 12  # ~1% false positives with k=4
+_BLOOM_WORDS = struct.Struct(f"<{_BLOOM_K}I")
+# Compact active_index.delta into active_index.bin once it grows past this
+# fraction of the base file.
+_ACTIVE_COMPACT_RATIO = 0.1
+# Parsed active_index.delta overlays keyed by (label, data_name), with the
+# (mtime_ns, size) of the file they were read from. A None value marks a
+# removal that shadows the base file.
+_ACTIVE_CACHE: dict[tuple[str, str], tuple[tuple[int, int] | None, dict[str, str | None]]] = {}
+
+
+def _file_sig(path: str) -> tuple[int, int] | None:
     try:
-        with open(path, "r", encoding="utf-8") as f:
-            for raw in f:
-                raw = raw.strip()
-                if not raw or "," not in raw:
-                    continue
-                prf_h, enc_meta = raw.split(",", 1)
-                mapping[prf_h.lower()] = enc_meta
+        st = os.stat(path)
     except OSError:
-        return {}
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+def _replay_changes(lines, active: dict[str, str]) -> None:
+    """Apply changes.log lines (EVENT OPRF_HEX ENC_META HASH) to ``active``.
+
+    The server writes OPRF_HEX with bytes.hex(), which is always lowercase, so
+    keys are used as-is and compare equal to a locally computed PRF.hex().
+    """
+    for ln in lines:
+        parts = ln.split()
+        if len(parts) < 4:
+            continue
+        event, prf_h, enc_meta = parts[0].upper(), parts[1], parts[2]
+        if event == "ADDED":
+            active[prf_h] = enc_meta
+        elif event == "REMOVED":
+            active.pop(prf_h, None)
+
+
+def _load_active_overlay(out_dir: str, label: str, data_name: str) -> dict[str, str | None]:
+    """Return the changes recorded in active_index.delta since the last compaction.
+
+    The file holds '+PRF,ENC_META' and '-PRF' lines appended by delta syncs.
+    """
+    delta_path = os.path.join(out_dir, "active_index.delta")
+    sig = _file_sig(delta_path)
+    cached = _ACTIVE_CACHE.get((label, data_name))
+    if cached is not None and cached[0] == sig:
+        return cached[1]
+    overlay: dict[str, str | None] = {}
+    if sig is not None:
+        with open(delta_path, "r", encoding="utf-8") as f:
+            for raw in f:
+                op = raw[:1]
+                if op == "+":
+                    prf_h, sep, enc_meta = raw[1:].partition(",")
+                    if sep:
+                        overlay[prf_h] = enc_meta.rstrip()
+                elif op == "-":
+                    overlay[raw[1:].rstrip()] = None
+    _ACTIVE_CACHE[(label, data_name)] = (sig, overlay)
+    return overlay
+
+
+def _parse_active_header(buf, path: str) -> tuple[int, int, int]:
+    """Return (N, bloom length, offset of the PRF table) for an index header."""
+    magic = bytes(buf[:8])
+    if magic == _ACTIVE_MAGIC and len(buf) >= _ACTIVE_HEADER.size:
+        _, n, bloom_len = _ACTIVE_HEADER.unpack_from(buf, 0)
+        return n, bloom_len, _ACTIVE_HEADER.size
+    if magic == _ACTIVE_MAGIC_V1 and len(buf) >= _ACTIVE_HEADER_V1.size:
+        _, n = _ACTIVE_HEADER_V1.unpack_from(buf, 0)
+        return n, 0, _ACTIVE_HEADER_V1.size
+    raise OSError(f"Unrecognized active index format: {path}")
+
+
+def _read_active_base(path: str) -> dict[str, str]:
+    """Decode every entry of active_index.bin into a PRF_HEX -> enc_meta dict."""
+    with open(path, "rb") as f:
+        data = f.read()
+    n, bloom_len, base = _parse_active_header(data, path)
+    prf_end = base + n * _PRF_LEN
+    blob_start = prf_end + (n + 1) * 8
+    if blob_start + bloom_len > len(data):
+        raise OSError(f"Truncated active index: {path}")
+    offsets = array("Q")
+    offsets.frombytes(data[prf_end:blob_start])
+    if sys.byteorder == "big":
+        offsets.byteswap()
+    if blob_start + offsets[n] + bloom_len != len(data):
+        raise OSError(f"Corrupt active index: {path}")
+    # One hex() and one decode() over whole regions, then slice per entry
+    prf_hex = data[base:prf_end].hex()
+    try:
+        blob = data[blob_start:blob_start + offsets[n]].decode("ascii")
+    except UnicodeDecodeError:
+        raise OSError(f"Corrupt active index: {path}") from None
+    step = 2 * _PRF_LEN
+    return {prf_hex[i * step:(i + 1) * step]: blob[offsets[i]:offsets[i + 1]] for i in range(n)}
+
+
+def _build_bloom(prfs: bytes, n: int) -> bytes:
+    """Return the Bloom filter over the concatenated, ``n`` raw PRFs."""
+    size = max(8, (n * _BLOOM_BITS_PER_KEY + 7) // 8)
+    m = size * 8
+    bits = bytearray(size)
+    words = array("I")
+    words.frombytes(prfs)
+    if sys.byteorder == "big":
+        words.byteswap()
+    stride = _PRF_LEN // 4
+    for i in range(0, len(words), stride):
+        for h in words[i:i + _BLOOM_K]:
+            h %= m
+            bits[h >> 3] |= 1 << (h & 7)
+    return bytes(bits)
+
+
+def _bloom_may_contain(buf, start: int, size: int, prf: bytes) -> bool:
+    m = size * 8
+    for h in _BLOOM_WORDS.unpack_from(prf):
+        h %= m
+        if not buf[start + (h >> 3)] & (1 << (h & 7)):
+            return False
+    return True
+
+
+def _is_hex(value: str) -> bool:
+    try:
+        bytes.fromhex(value)
+    except ValueError:
+        return False
+    return True
+
+
+def _write_active_base(path: str, active: dict[str, str]) -> None:
+    """Atomically replace active_index.bin with the given mapping."""
+    # Lowercase hex sorts like the raw bytes, so sort the keys as strings and
+    # convert them with a single fromhex() over the concatenation.
+    keys = sorted(k for k, v in active.items() if len(k) == 2 * _PRF_LEN and v.isascii())
+    joined = "".join(keys)
+    if joined != joined.lower():
+        # Not canonical server output; normalize so the sort order holds
+        active = {k.lower(): active[k] for k in keys}
+        keys = sorted(active)
+        joined = "".join(keys)
+    try:
+        prfs = bytes.fromhex(joined)
+    except ValueError:
+        keys = [k for k in keys if _is_hex(k)]  # drop malformed entries
+        prfs = bytes.fromhex("".join(keys))
+    metas = [active[k].encode("ascii") for k in keys]
+    offsets = array("Q", [0])
+    for meta in metas:
+        offsets.append(offsets[-1] + len(meta))
+    if sys.byteorder == "big":
+        offsets.byteswap()
+    bloom = _build_bloom(prfs, len(keys))
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(b"".join((
+            _ACTIVE_HEADER.pack(_ACTIVE_MAGIC, len(keys), len(bloom)),
+            prfs,
+            offsets.tobytes(),
+            *metas,
+            bloom,
+        )))
+    os.replace(tmp_path, path)
+
+
+def _lookup_active_base(path: str, prf: bytes) -> str | None:
+    """Binary-search active_index.bin for ``prf``; return its enc_meta or None."""
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if size < _ACTIVE_HEADER_V1.size:
+            raise OSError(f"Truncated active index: {path}")
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            n, bloom_len, base = _parse_active_header(mm, path)
+            off_base = base + n * _PRF_LEN
+            blob = off_base + (n + 1) * 8
+            if blob + bloom_len > size:
+                raise OSError(f"Truncated active index: {path}")
+            # The last offset is the blob length; check the file adds up
+            # before trusting the filter at its tail
+            (blob_len,) = struct.unpack_from("<Q", mm, blob - 8)
+            if blob + blob_len + bloom_len != size:
+                raise OSError(f"Corrupt active index: {path}")
+            if bloom_len and not _bloom_may_contain(mm, size - bloom_len, bloom_len, prf):
+                return None
+            lo, hi = 0, n
+            while lo < hi:
+                mid = (lo + hi) // 2
+                pos = base + mid * _PRF_LEN
+                if mm[pos:pos + _PRF_LEN] < prf:
+                    lo = mid + 1
+                else:
+                    hi = mid
+            pos = base + lo * _PRF_LEN
+            if lo == n or mm[pos:pos + _PRF_LEN] != prf:
+                return None
+            start, end = struct.unpack_from("<QQ", mm, off_base + lo * 8)
+            if not start <= end <= blob_len:
+                raise OSError(f"Corrupt active index: {path}")
+            try:
+                return mm[blob + start:blob + end].decode("ascii")
+            except UnicodeDecodeError:
+                raise OSError(f"Corrupt active index: {path}") from None
+
+
+def _lookup_active(label: str, data_name: str, prf: bytes) -> str | None:
+    """Return the enc_meta for ``prf`` from the active index, or None if inactive.
+
+    Raises FileNotFoundError when no active index has been built yet.
+    """
+    out_dir = _dataset_dir(label, data_name)
+    path = os.path.join(out_dir, "active_index.bin")
+    overlay = _load_active_overlay(out_dir, label, data_name)
+    prf_hex = prf.hex()
+    if prf_hex in overlay:
+        return overlay[prf_hex]
+    return _lookup_active_base(path, prf)
+
+
+def _load_active_index(label: str, data_name: str) -> dict[str, str]:
+    """Return the full PRF -> enc_meta mapping: active_index.bin plus pending deltas."""
+    return _merge_active_index(_dataset_dir(label, data_name), label, data_name)
+
+
+def _merge_active_index(out_dir: str, label: str, data_name: str) -> dict[str, str]:
+    path = os.path.join(out_dir, "active_index.bin")
+    # Only a missing base means "empty"; an unreadable or corrupt one must not
+    # be compacted over, so those errors reach the caller
+    try:
+        mapping = _read_active_base(path)
+    except FileNotFoundError:
+        mapping = {}
+    overlay = _load_active_overlay(out_dir, label, data_name)
+    for prf_h, enc_meta in overlay.items():
+        if enc_meta is None:
+            mapping.pop(prf_h, None)
+        else:
+            mapping[prf_h] = enc_meta
     return mapping
 
 
+def _store_active_index(out_dir: str, label: str, data_name: str, active: dict[str, str] | None, diff: list[str] | None) -> None:
+    """Persist the active index after a sync.
+
+    A full sync passes the complete ``active`` mapping, which replaces
+    active_index.bin. A delta sync onto an existing index passes only ``diff``
+    lines, which are appended to active_index.delta; the base file is rebuilt
+    once the delta file grows past _ACTIVE_COMPACT_RATIO of its size.
+    """
+    path = os.path.join(out_dir, "active_index.bin")
+    delta_path = os.path.join(out_dir, "active_index.delta")
+    if active is None:
+        with open(delta_path, "a", encoding="utf-8") as f:
+            f.write("".join(diff or ()))
+        if os.path.getsize(delta_path) <= os.path.getsize(path) * _ACTIVE_COMPACT_RATIO:
+            return
+        active = _merge_active_index(out_dir, label, data_name)
+    _write_active_base(path, active)
+    for stale in (delta_path, os.path.join(out_dir, "active_index.csv")):
+        try:
+            os.remove(stale)
+        except FileNotFoundError:
+            pass
+    _ACTIVE_CACHE.pop((label, data_name), None)
+
+
+def _rebuild_active_index(label: str, data_name: str) -> None:
+    """Rebuild active_index.bin from the local changes.log."""
+    active: dict[str, str] = {}
+    _replay_changes(_load_local_changes_log(label, data_name), active)
+    _store_active_index(_dataset_dir(label, data_name), label, data_name, active, None)
+
+
+def _find_active(label: str, data_name: str, prf: bytes) -> str | None:
+    """Look up ``prf`` in the active index, building it from changes.log if missing."""
+    try:
+        return _lookup_active(label, data_name, prf)
+    except FileNotFoundError:
+        _rebuild_active_index(label, data_name)
+        return _lookup_active(label, data_name, prf)
+
+
+def _sync_if_stale(host: str, port: int, label: str, data_name: str, server: str) -> int:
+    """Sync changes.log unless a cheap probe shows the local copy is current."""
+    local_log = os.path.join(_dataset_dir(label, data_name), "changes.log")
+    local_hash = _latest_hash_from_file(local_log)
+    try:
+        remote_hash = _http_get_json(f"http://{host}:{port}/latest_hash?data_type={data_name}").get("hash")
+    except Exception:
+        remote_hash = None  # older server or transient failure: just sync
+    if local_hash and remote_hash == local_hash:
+        return 0
+    sync_args = argparse.Namespace(server=server, data_name=data_name, hash=None)
+    return cmd_sync_data(sync_args)
+
+
+def _blind_iocs(data_name: str, iocs: list[bytes]) -> list[tuple[bytes, bytes]]:
+    """Return (r, B) per IOC: B = r * H(IOC) for a fresh ephemeral scalar r."""
+    blinds = []
+    for ioc_bytes in iocs:
+        P = crypto_tools.ristretto_hash_to_group(data_name, ioc_bytes)
+        r = crypto_tools.ristretto_scalar_random()
+        blinds.append((r, crypto_tools.ristretto_scalarmult(r, P)))
+    return blinds
+
+
+def _prepare_query(
+    host: str, port: int, label: str, data_name: str, server: str, iocs: list[bytes]
+) -> tuple[int, list[tuple[bytes, bytes]]]:
+    """Sync local state, check the server's suite and blind ``iocs``.
+
+    None of these depend on each other, so the sync and the /encryption_type
+    request run on worker threads while this thread does the blinding (the
+    libsodium calls release the GIL). Returns (exit code, blinds).
+    """
+    with ThreadPoolExecutor(max_workers=2) as ex:
+        f_sync = ex.submit(_sync_if_stale, host, port, label, data_name, server)
+        f_info = ex.submit(_http_get_json, f"http://{host}:{port}/encryption_type?data_type={data_name}")
+        blinds = _blind_iocs(data_name, iocs)
+        rc = f_sync.result()
+        try:
+            info = f_info.result()
+        except Exception as e:
+            info = e
+    if rc != 0:
+        return rc, blinds
+    if isinstance(info, Exception):
+        print(f"Failed to query encryption_type: {info}", file=sys.stderr)
+        return 1, blinds
+    if info.get("encryption") != "xchacha20poly1305-ietf" or info.get("suite") != "oprf-ristretto255-sha512":
+        print("Unsupported suite/encryption returned by server", file=sys.stderr)
+        return 1, blinds
+    return 0, blinds
+
+
+def _evaluate_iocs(
+    host: str, port: int, data_name: str, iocs: list[bytes], blinds: list[tuple[bytes, bytes]]
+) -> list[tuple[bytes, bytes]] | None:
+    """Evaluate the blinded ``iocs`` in one /oprf_evaluate request.
+
+    Returns (PRF, Q) per IOC in input order, or None after printing an error.
+    A single IOC is sent as a plain hex string so older servers still work.
+    """
+    blinded = [B.hex() for _, B in blinds]
+    try:
+        res = _http_post_json(
+            f"http://{host}:{port}/oprf_evaluate",
+            {"data_type": data_name, "blinded": blinded[0] if len(blinded) == 1 else blinded},
+        )
+    except Exception as e:
+        print(f"OPRF evaluate request failed: {e}", file=sys.stderr)
+        return None
+    evaluated = res.get("evaluated")
+    if isinstance(evaluated, str):
+        evaluated = [evaluated]
+    if (
+        not isinstance(evaluated, list)
+        or len(evaluated) != len(iocs)
+        or not all(isinstance(e, str) for e in evaluated)
+    ):
+        print("Invalid server response (missing 'evaluated')", file=sys.stderr)
+        return None
+
+    out = []
+    for ioc_bytes, (r, _), E_hex in zip(iocs, blinds, evaluated):
+        # Unblind, then finalize
+        E = bytes.fromhex(E_hex)
+        r_inv = crypto_tools.ristretto_scalar_invert(r)
+        Q = crypto_tools.ristretto_scalarmult(r_inv, E)
+        out.append((crypto_tools.oprf_finalize(data_name, ioc_bytes, Q), Q))
+    return out
+
+
+def _decrypt_enc_meta(data_name: str, ioc_bytes: bytes, prf: bytes, q: bytes, enc_meta_hex: str) -> bytes:
+    nonce_hex, ct_hex = enc_meta_hex.split(":", 1)
+    nonce = bytes.fromhex(nonce_hex)
+    if len(nonce) != 24:
+        raise ValueError(f"Invalid metadata nonce length: {len(nonce)} (expected 24)")
+    ct = bytes.fromhex(ct_hex)
+    return crypto_tools.decrypt_metadata_from_prf_and_q(data_name, ioc_bytes, prf, q, nonce, ct)
+
+
+def _record_match(out_dir: str, ioc: str, prf_hex: str, meta: bytes) -> None:
+    # Optionally persist
+    try:
+        with open(os.path.join(out_dir, "matches.txt"), "a", encoding="utf-8") as f:
+            f.write(f"{ioc},{prf_hex},{meta.decode('utf-8', 'replace')}\n")
+    except OSError:
+        pass
+
+
 def cmd_query(args: argparse.Namespace) -> int:
     data_name = args.data_name
-    if not ALNUM_RE.fullmatch(data_name):
+    if not (data_name.isascii() and data_name.isalnum()):
         print("data_name must be alphanumeric", file=sys.stderr)
         return 2
     try:
@@ -114,80 +573,32 @@ def cmd_query(args: argparse.Namespace) -> int:
         print(str(e), file=sys.stderr)
         return 2
 
-    base_dir = os.path.dirname(os.path.abspath(__file__))
-    # Always sync latest changes from server before querying
-    sync_args = argparse.Namespace(server=args.server, data_name=args.data_name, hash=None)
-    rc = cmd_sync_data(sync_args)
+    ioc_bytes = args.ioc.encode("utf-8")
+    rc, blinds = _prepare_query(host, port, label, data_name, args.server, [ioc_bytes])
     if rc != 0:
         return rc
-    # 1) Discover encryption type
-    try:
-        info = _http_get_json(f"http://{host}:{port}/encryption_type?data_type={data_name}")
-    except Exception as e:
-        print(f"Failed to query encryption_type: {e}", file=sys.stderr)
-        return 1
-    if info.get("encryption") != "xchacha20poly1305-ietf" or info.get("suite") != "oprf-ristretto255-sha512":
-        print("Unsupported suite/encryption returned by server", file=sys.stderr)
-        return 1
 
-    # 2) Hash to group
-    ioc_bytes = args.ioc.encode("utf-8")
-    P = crypto_tools.ristretto_hash_to_group(data_name, ioc_bytes)
-
-    # 3) Blind with ephemeral scalar
-    r = crypto_tools.ristretto_scalar_random()
-    B = crypto_tools.ristretto_scalarmult(r, P)
+    results = _evaluate_iocs(host, port, data_name, [ioc_bytes], blinds)
+    if results is None:
+        return 1
+    PRF, Q = results[0]
+    prf_hex = PRF.hex()
 
-    # 4) Transmit to server for evaluation
+    # Check for matches using the maintained active index
     try:
-        res = _http_post_json(f"http://{host}:{port}/oprf_evaluate", {"data_type": data_name, "blinded": B.hex()})
-    except Exception as e:
-        print(f"OPRF evaluate request failed: {e}", file=sys.stderr)
+        enc_meta_hex = _find_active(label, data_name, PRF)
+    except FileNotFoundError as e:
+        print(str(e), file=sys.stderr)
         return 1
-    E_hex = res.get("evaluated")
-    if not isinstance(E_hex, str):
-        print("Invalid server response (missing 'evaluated')", file=sys.stderr)
+    except OSError as e:
+        print(f"Failed to read active index: {e}", file=sys.stderr)
         return 1
-    E = bytes.fromhex(E_hex)
-
-    # 5) Unblind
-    r_inv = crypto_tools.ristretto_scalar_invert(r)
-    Q = crypto_tools.ristretto_scalarmult(r_inv, E)
-
-    # 6) Finalize
-    PRF = crypto_tools.oprf_finalize(data_name, ioc_bytes, Q)
-    prf_hex = PRF.hex()
-
-    # 7) Check for matches using the maintained active index
-    active = _load_active_index(base_dir, label, data_name)
-    if not active:
-        # Fallback to replaying local changes.log if index missing
-        try:
-            lines = _load_local_changes_log(base_dir, label, data_name)
-        except FileNotFoundError as e:
-            print(str(e), file=sys.stderr)
-            return 1
-        for line in lines:
-            parts = line.strip().split()
-            if len(parts) < 4:
-                continue
-            event, prf_h, enc_meta = parts[0].upper(), parts[1], parts[2]
-            if event == "ADDED":
-                active[prf_h.lower()] = enc_meta
-            elif event == "REMOVED":
-                active.pop(prf_h.lower(), None)
-
-    enc_meta_hex = active.get(prf_hex.lower())
     if not enc_meta_hex:
         print("No active match found in changes.log (either not present or removed)")
         return 0
 
-    # 8) Decrypt metadata
     try:
-        nonce_hex, ct_hex = enc_meta_hex.split(":", 1)
-        nonce = bytes.fromhex(nonce_hex)
-        ct = bytes.fromhex(ct_hex)
-        meta = crypto_tools.decrypt_metadata_from_prf_and_q(data_name, ioc_bytes, PRF, Q, nonce, ct)
+        meta = _decrypt_enc_meta(data_name, ioc_bytes, PRF, Q, enc_meta_hex)
     except Exception as e:
         print(f"Failed to decrypt metadata: {e}", file=sys.stderr)
         return 1
@@ -195,17 +606,68 @@ def cmd_query(args: argparse.Namespace) -> int:
     print("Match found.")
     print(f"PRF: {prf_hex}")
     print(f"Metadata: {meta.decode('utf-8', 'replace')}")
-    # Optionally persist
-    out_dir = os.path.join(base_dir, "data", label, data_name)
-    try:
-        with open(os.path.join(out_dir, "matches.txt"), "a", encoding="utf-8") as f:
-            f.write(f"{args.ioc},{prf_hex},{meta.decode('utf-8', 'replace')}\n")
-    except OSError:
-        pass
+    _record_match(_dataset_dir(label, data_name), args.ioc, prf_hex, meta)
     return 0
+
+
+def cmd_query_batch(args: argparse.Namespace) -> int:
+    """Query every IOC in a file (one per line) with a single OPRF round-trip."""
+    data_name = args.data_name
+    if not (data_name.isascii() and data_name.isalnum()):
+        print("data_name must be alphanumeric", file=sys.stderr)
+        return 2
+    try:
+        host, port, label = _normalize_server(args.server)
+    except ValueError as e:
+        print(str(e), file=sys.stderr)
+        return 2
+    try:
+        with open(args.ioc_file, "r", encoding="utf-8") as f:
+            iocs = [ln.strip() for ln in f if ln.strip()]
+    except OSError as e:
+        print(f"Failed to read IOC file: {e}", file=sys.stderr)
+        return 1
+    if not iocs:
+        print("No IOCs to query")
+        return 0
+
+    ioc_list = [ioc.encode("utf-8") for ioc in iocs]
+    rc, blinds = _prepare_query(host, port, label, data_name, args.server, ioc_list)
+    if rc != 0:
+        return rc
+
+    results = _evaluate_iocs(host, port, data_name, ioc_list, blinds)
+    if results is None:
+        return 1
+
+    out_dir = _dataset_dir(label, data_name)
+    rc = 0
+    for ioc, ioc_bytes, (PRF, Q) in zip(iocs, ioc_list, results):
+        try:
+            enc_meta_hex = _find_active(label, data_name, PRF)
+        except FileNotFoundError as e:
+            print(str(e), file=sys.stderr)
+            return 1
+        except OSError as e:
+            print(f"Failed to read active index: {e}", file=sys.stderr)
+            return 1
+        if not enc_meta_hex:
+            print(f"{ioc}: no active match")
+            continue
+        try:
+            meta = _decrypt_enc_meta(data_name, ioc_bytes, PRF, Q, enc_meta_hex)
+        except Exception as e:
+            print(f"{ioc}: failed to decrypt metadata: {e}", file=sys.stderr)
+            rc = 1
+            continue
+        print(f"{ioc}: match {meta.decode('utf-8', 'replace')}")
+        _record_match(out_dir, ioc, PRF.hex(), meta)
+    return rc
+
+
 def cmd_sync_data(args: argparse.Namespace) -> int:
     data_name = args.data_name
-    if not ALNUM_RE.fullmatch(data_name):
+    if not (data_name.isascii() and data_name.isalnum()):
         print("data_name must be alphanumeric (A–Z, a–z, 0–9)", file=sys.stderr)
         return 2
     try:
@@ -214,8 +676,7 @@ def cmd_sync_data(args: argparse.Namespace) -> int:
         print(str(e), file=sys.stderr)
         return 2
 
-    base_dir = os.path.dirname(os.path.abspath(__file__))
-    out_dir = os.path.join(base_dir, "data", label, data_name)
+    out_dir = _dataset_dir(label, data_name)
     os.makedirs(out_dir, exist_ok=True)
 
     local_log = os.path.join(out_dir, "changes.log")
@@ -232,16 +693,25 @@ def cmd_sync_data(args: argparse.Namespace) -> int:
     url = f"http://{host}:{port}/sync_data?{urlencode(qs)}"
 
     try:
-        req = Request(url, headers={"Accept": "text/plain"})
-        with urlopen(req) as resp:  # nosec - user supplies host; this is a CLI client
-            if resp.status != 200:
-                print(f"Server returned HTTP {resp.status}", file=sys.stderr)
-                return 1
-            body = resp.read()
-            delta_mode = (resp.headers.get("X-Delta", "").lower() == "delta")
+        status, headers, body = _http_request(
+            url, headers={"Accept": "text/plain", "Accept-Encoding": compress_tools.ACCEPT_ENCODING}
+        )  # nosec - user supplies host; this is a CLI client
     except Exception as e:
         print(f"Request failed: {e}", file=sys.stderr)
         return 1
+    if status != 200:
+        print(f"Server returned HTTP {status}", file=sys.stderr)
+        return 1
+    try:
+        # The server only compresses bodies up to MAX_SIZE; anything that
+        # inflates past it is refused rather than decoded into memory
+        body = compress_tools.decompress(
+            body, headers.get("Content-Encoding"), max_size=compress_tools.MAX_SIZE
+        )
+    except Exception as e:
+        print(f"Failed to decode response body: {e}", file=sys.stderr)
+        return 1
+    delta_mode = (headers.get("X-Delta", "").lower() == "delta")
 
     if not body:
         print("No new changes received (empty response).")
@@ -250,12 +720,14 @@ def cmd_sync_data(args: argparse.Namespace) -> int:
     # If we received a full response (e.g., after rekey), purge old delta-* logs
     if not delta_mode:
         try:
-            for name in os.listdir(out_dir):
-                if name.startswith("delta-") and name.endswith(".log"):
-                    try:
-                        os.remove(os.path.join(out_dir, name))
-                    except OSError:
-                        pass
+            with os.scandir(out_dir) as it:
+                for entry in it:
+                    name = entry.name
+                    if name.startswith("delta-") and name.endswith(".log") and entry.is_file():
+                        try:
+                            os.unlink(entry.path)
+                        except OSError:
+                            pass
         except OSError:
             pass
 
@@ -272,56 +744,59 @@ def cmd_sync_data(args: argparse.Namespace) -> int:
 
     # Write to local changes.log (append for delta, reset for full)
     try:
-        text = body.decode("utf-8", errors="replace")
         if not delta_mode:
             # Remove existing state to avoid mixing with a new full replay
             try:
                 if os.path.exists(local_log):
                     os.remove(local_log)
-                # Also reset active index
-                active_index_path = os.path.join(out_dir, "active_index.csv")
-                if os.path.exists(active_index_path):
-                    os.remove(active_index_path)
+                # Also reset active index and its pending deltas
+                for name in ("active_index.bin", "active_index.delta", "active_index.csv"):
+                    index_file = os.path.join(out_dir, name)
+                    if os.path.exists(index_file):
+                        os.remove(index_file)
             except OSError:
                 pass
-        mode = "a" if delta_mode else "w"
-        with open(local_log, mode, encoding="utf-8") as f:
-            if not text.endswith("\n"):
-                text += "\n"
-            f.write(text)
+        # The server sends the log bytes verbatim, so append them as-is
+        # rather than decoding and re-encoding the whole payload
+        with open(local_log, "ab" if delta_mode else "wb") as f:
+            f.write(body)
+            if not body.endswith(b"\n"):
+                f.write(b"\n")
     except OSError as e:
         print(f"Failed to write local changes.log: {e}", file=sys.stderr)
         return 1
 
-    # Update or rebuild active_index.csv used for matching
+    # Update or rebuild active_index.bin used for matching; the payload is
+    # walked once, either replayed into a fresh index or turned into diff lines
     try:
-        active_index_path = os.path.join(out_dir, "active_index.csv")
-        if delta_mode and os.path.exists(active_index_path):
-            # Load current active set
-            active = _load_active_index(base_dir, label, data_name)
+        active_index_path = os.path.join(out_dir, "active_index.bin")
+        active: dict[str, str] | None = None
+        diff: list[str] | None = None
+        if not delta_mode:
+            active = {}
+            _replay_changes(body.decode("utf-8", errors="replace").splitlines(), active)
+        elif os.path.exists(active_index_path):
+            # Record only what this delta changes; the base stays untouched
+            diff = []
+            for ln in body.decode("utf-8", errors="replace").splitlines():
+                parts = ln.split()
+                if len(parts) < 4:
+                    continue
+                event = parts[0].upper()
+                if event == "ADDED":
+                    diff.append(f"+{parts[1]},{parts[2]}\n")
+                elif event == "REMOVED":
+                    diff.append(f"-{parts[1]}\n")
         else:
+            # No base index yet (or one in an older format): rebuild it from
+            # the local changes.log, which now includes this delta
             active = {}
+            with open(local_log, "r", encoding="utf-8", errors="replace") as f:
+                _replay_changes(f, active)
 
-        # Apply new events from response text
-        for ln in text.splitlines():
-            ln = ln.strip()
-            if not ln:
-                continue
-            parts = ln.split()
-            if len(parts) < 4:
-                continue
-            event, prf_h, enc_meta = parts[0].upper(), parts[1], parts[2]
-            key = prf_h.lower()
-            if event == "ADDED":
-                active[key] = enc_meta
-            elif event == "REMOVED":
-                active.pop(key, None)
-
-        with open(active_index_path, "w", encoding="utf-8") as f:
-            for prf_h, enc_meta in active.items():
-                f.write(f"{prf_h},{enc_meta}\n")
+        _store_active_index(out_dir, label, data_name, active, diff)
     except OSError as e:
-        print(f"Failed to update active_index.csv: {e}", file=sys.stderr)
+        print(f"Failed to update active index: {e}", file=sys.stderr)
         return 1
 
     print(f"Saved changes to: {local_log}")
@@ -362,12 +837,11 @@ def build_parser() -> argparse.ArgumentParser:
         except ValueError as e:
             print(str(e), file=sys.stderr)
             return 2
-        base_dir = os.path.dirname(os.path.abspath(__file__))
-        out_dir = os.path.join(base_dir, "data", label, args.data_name)
+        out_dir = _dataset_dir(label, args.data_name)
         if os.path.isdir(out_dir):
             shutil.rmtree(out_dir, ignore_errors=True)
         # After removing the dataset, also remove the per-server directory if now empty
-        label_dir = os.path.join(base_dir, "data", label)
+        label_dir = os.path.join(_DATA_DIR, label)
         try:
             if os.path.isdir(label_dir) and not os.listdir(label_dir):
                 os.rmdir(label_dir)
@@ -381,6 +855,12 @@ def build_parser() -> argparse.ArgumentParser:
     pq.add_argument("data_name", help="Alphanumeric data source name")
     pq.add_argument("ioc", help="IOC string to query (exact string used in source file)")
     pq.set_defaults(func=cmd_query)
+
+    pb = sub.add_parser("query_batch", help="Query many IOCs (one per line) in a single OPRF request")
+    pb.add_argument("server", help="Server in host:port format")
+    pb.add_argument("data_name", help="Alphanumeric data source name")
+    pb.add_argument("ioc_file", help="Path to a file with one IOC per line")
+    pb.set_defaults(func=cmd_query_batch)
     return p
 
 
@@ -7,20 +7,31 @@ Syncs from the server and performs a single query for the provided IOC.
 Usage:
   python client_simple.py <ioc> [--server 127.0.0.1:8000] [--name testSource]
 
-This is a convenience wrapper around `python -m client.cli` commands.
+This is a convenience wrapper around the `python -m client.cli` commands; they
+run in this process rather than as separate Python invocations.
 """
 from __future__ import annotations
 
 import argparse
-import subprocess
 import sys
 
 
-def run(cmd: list[str]) -> None:
-    print("$", " ".join(cmd))
-    proc = subprocess.run(cmd)
-    if proc.returncode != 0:
-        sys.exit(proc.returncode)
+def cli(argv: list[str]) -> int:
+    """Run ``client.cli`` in-process and return its exit code."""
+    from client.cli import main as cli_main
+
+    try:
+        rc = cli_main(argv)
+    except SystemExit as e:  # commands exit(rc) on failure; argparse on bad input
+        rc = e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+    return rc or 0
+
+
+def run(argv: list[str]) -> None:
+    print("$ python -m client.cli", " ".join(argv))
+    rc = cli(argv)
+    if rc != 0:
+        sys.exit(rc)
 
 
 def main() -> int:
@@ -31,9 +42,9 @@ def main() -> int:
     args = ap.parse_args()
 
     # 1) Ensure local state is synced
-    run([sys.executable, "-m", "client.cli", "sync_data", args.server, args.name])
+    run(["sync_data", args.server, args.name])
     # 2) Query the provided IOC
-    run([sys.executable, "-m", "client.cli", "query", args.server, args.name, args.ioc])
+    run(["query", args.server, args.name, args.ioc])
     return 0
 
 
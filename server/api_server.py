@@ -1,7 +1,7 @@
 import os
-import re
-import json
 import sys
+import threading
+import time
 from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
 from urllib.parse import urlparse, parse_qs
 # Ensure workspace root is importable before importing our local 'shared' package
@@ -10,28 +10,194 @@ _WORKSPACE_ROOT = os.path.dirname(_THIS_DIR)
 if _WORKSPACE_ROOT not in sys.path:
     sys.path.insert(0, _WORKSPACE_ROOT)
 
-from shared import crypto_tools
+from shared import compress_tools, crypto_tools, json_tools
 
 
-ALNUM_RE = re.compile(r"^[A-Za-z0-9]+$")
+# Upper bound on blinded points accepted by one /oprf_evaluate request
+MAX_OPRF_BATCH = 1024
+# Largest /oprf_evaluate body read: a full batch is about 67 bytes per quoted
+# hex point, so this leaves room for whitespace and the data_type
+MAX_OPRF_BODY = MAX_OPRF_BATCH * 80 + 1024
 
+# Per-dataset roots, resolved once instead of on every request
+_DATA_DIR = os.path.join(_THIS_DIR, "data")
+_SCHEMAS_DIR = os.path.join(_THIS_DIR, "schemas")
+_SECRETS_DIR = os.path.join(_THIS_DIR, "secrets")
 
-def _read_changes_log(base_dir: str, data_type: str) -> list[str]:
-    path = os.path.join(base_dir, "data", data_type, "changes.log")
-    if not os.path.exists(path):
-        raise FileNotFoundError(path)
-    with open(path, "r", encoding="utf-8") as f:
-        return f.readlines()
+_WS = b" \t\r\v\f"
+_SCAN_BLOCK = 1 << 20
+
+
+class _LogIndex:
+    """Byte offsets into one changes.log, keyed by the hash ending each line.
+
+    ``offsets[h]`` is the offset of the line following the line whose hash is
+    ``h``, so a delta sync is a single seek. ``end`` is the offset just past
+    the last complete line indexed and ``tail`` holds that line's bytes, which
+    lets a later request tell an append apart from a rewritten log.
+    ``last_hash`` is the newest hash in the log (None while it is empty).
+    """
+
+    __slots__ = ("ino", "end", "tail", "offsets", "last_hash")
+
+    def __init__(self, ino: int) -> None:
+        self.ino = ino
+        self.end = 0
+        self.tail = b""
+        self.offsets: dict[str, int] = {}
+        self.last_hash: str | None = None
+
+    def matches(self, f, st: os.stat_result) -> bool:
+        if st.st_ino != self.ino or st.st_size < self.end:
+            return False
+        if not self.tail:
+            return True
+        f.seek(self.end - len(self.tail))
+        return f.read(len(self.tail)) == self.tail
+
+    def extend(self, f) -> None:
+        # Read [end, EOF) in blocks with pread rather than mmap: the file can
+        # be truncated while we scan, and touching a mapped page past
+        # the new EOF would raise SIGBUS. find() keeps per-line allocations
+        # down to the hash tokens.
+        fd = f.fileno()
+        offsets = self.offsets
+        pos = self.end  # file offset of data[0]
+        read_at = pos
+        pending = b""
+        tail = None
+        last = None
+        while True:
+            block = os.pread(fd, _SCAN_BLOCK, read_at)
+            if not block:
+                break
+            read_at += len(block)
+            data = pending + block
+            find, rfind = data.find, data.rfind
+            start = 0
+            while True:
+                nl = find(b"\n", start)
+                if nl < 0:
+                    break  # partial line still being written; index it next time
+                # Common case: "... HASH\n" with a single-space separator
+                tok = data[max(rfind(b" ", start, nl) + 1, start):nl]
+                if not tok or tok[-1] in _WS or b"\t" in tok:
+                    toks = data[start:nl].split()
+                    tok = toks[-1] if toks else None
+                if tok:
+                    h = tok.decode("ascii", "replace")
+                    # Keep the first occurrence, matching a top-down scan
+                    offsets.setdefault(h, pos + nl + 1)
+                    last = h
+                tail = data[start:nl + 1]
+                start = nl + 1
+            pos += start
+            pending = data[start:]
+        if tail is not None:
+            self.tail = tail
+            self.end = pos
+            if last is not None:
+                self.last_hash = last
+
+
+# changes.log is written by the CLI in another process: appended on sync,
+# replaced wholesale on rekey. Indexes are built lazily per data_type,
+# extended when the file grows and rebuilt when its history changed.
+_LOG_INDEX: dict[str, _LogIndex] = {}
+_LOG_INDEX_LOCK = threading.Lock()
+
+
+def _changes_log_index(f, data_type: str) -> _LogIndex:
+    """Return the up-to-date index for an open changes.log."""
+    st = os.fstat(f.fileno())
+    with _LOG_INDEX_LOCK:
+        idx = _LOG_INDEX.get(data_type)
+        if idx is None or not idx.matches(f, st):
+            idx = _LogIndex(st.st_ino)
+            _LOG_INDEX[data_type] = idx
+        if st.st_size > idx.end:
+            idx.extend(f)
+        return idx
+
+
+# Data types with a schemas/<data_type>/schema.json, so a request does not
+# need a stat() to validate its data_type. A hit is trusted until the set
+# is _KNOWN_TTL seconds old (picks up removals); a miss rescans at most once
+# per _KNOWN_MISS_RESCAN seconds and otherwise falls back to a single stat,
+# so a new source shows up at once without letting unknown names force a
+# directory scan each.
+_KNOWN_TTL = 30.0
+_KNOWN_MISS_RESCAN = 1.0
+_KNOWN_DATA_TYPES: frozenset[str] = frozenset()
+_KNOWN_SCANNED = float("-inf")
+_KNOWN_LOCK = threading.Lock()
+
+
+def _scan_data_types() -> frozenset[str]:
+    known = set()
+    try:
+        with os.scandir(_SCHEMAS_DIR) as it:
+            for entry in it:
+                if entry.is_dir() and os.path.isfile(os.path.join(entry.path, "schema.json")):
+                    known.add(entry.name)
+    except OSError:
+        pass
+    return frozenset(known)
+
+
+def _is_known_data_type(data_type: str) -> bool:
+    global _KNOWN_DATA_TYPES, _KNOWN_SCANNED
+    age = time.monotonic() - _KNOWN_SCANNED
+    if data_type in _KNOWN_DATA_TYPES:
+        if age < _KNOWN_TTL:
+            return True
+    elif age < _KNOWN_MISS_RESCAN:
+        # Created since the last scan, or unknown
+        return os.path.isfile(os.path.join(_SCHEMAS_DIR, data_type, "schema.json"))
+    with _KNOWN_LOCK:
+        # Another thread may have rescanned while we waited
+        if time.monotonic() - _KNOWN_SCANNED >= _KNOWN_MISS_RESCAN:
+            _KNOWN_DATA_TYPES = _scan_data_types()
+            _KNOWN_SCANNED = time.monotonic()
+        return data_type in _KNOWN_DATA_TYPES
+
+
+# Private keys by data_type, reloaded when the file's stat signature changes
+# (rekey/create_source rewrite it in place), so rotation needs no restart.
+_SK_CACHE: dict[str, tuple[tuple[int, int, int], bytes]] = {}
+_SK_CACHE_LOCK = threading.Lock()
+
+
+def _get_sk(data_type: str) -> bytes:
+    """Return the private key for ``data_type``; raises OSError if unreadable."""
+    key_path = os.path.join(_SECRETS_DIR, data_type, "private.key")
+    st = os.stat(key_path)
+    sig = (st.st_ino, st.st_size, st.st_mtime_ns)
+    cached = _SK_CACHE.get(data_type)
+    if cached is not None and cached[0] == sig:
+        return cached[1]
+    with open(key_path, "rb") as f:
+        sk = f.read()
+    with _SK_CACHE_LOCK:
+        _SK_CACHE[data_type] = (sig, sk)
+    return sk
 
 
 class SyncHandler(BaseHTTPRequestHandler):
     server_version = "SimpleSyncServer/0.1"
+    # HTTP/1.1 keeps connections open between requests (every response sets
+    # Content-Length), so clients can reuse one socket for a whole query.
+    protocol_version = "HTTP/1.1"
+    # Close idle keep-alive connections so handler threads do not linger.
+    timeout = 30
 
     def _send_json(self, status: int, payload: dict) -> None:
-        body = json.dumps(payload).encode("utf-8")
+        body = json_tools.dumps(payload)
         self.send_response(status)
         self.send_header("Content-Type", "application/json; charset=utf-8")
         self.send_header("Content-Length", str(len(body)))
+        if self.close_connection:
+            self.send_header("Connection", "close")
         self.end_headers()
         self.wfile.write(body)
 
@@ -40,59 +206,89 @@ class SyncHandler(BaseHTTPRequestHandler):
         # Normalize trailing slash to support both /path and /path/
         path = parsed.path.rstrip("/") or "/"
         qs = parse_qs(parsed.query)
-        base_dir = os.path.dirname(os.path.abspath(__file__))
 
         if path == "/sync_data":
             data_type = (qs.get("data_type") or [None])[0]
             last_hash = (qs.get("hash") or [None])[0]
 
-            if not data_type or not ALNUM_RE.fullmatch(data_type):
+            if not data_type or not (data_type.isascii() and data_type.isalnum()):
                 self._send_json(400, {"error": "Invalid or missing data_type (alphanumeric only)"})
                 return
 
+            log_path = os.path.join(_DATA_DIR, data_type, "changes.log")
             try:
-                lines = _read_changes_log(base_dir, data_type)
+                f = open(log_path, "rb")
             except FileNotFoundError:
                 self._send_json(404, {"error": "changes.log not found for data_type"})
                 return
+            with f:
+                idx = _changes_log_index(f, data_type)
+                offset = idx.offsets.get(last_hash) if last_hash else None
+                matched = offset is not None
+                offset = offset or 0
+                # Serve only complete, indexed lines; a line a concurrent
+                # sync is still writing goes out with the next request
+                length = max(0, idx.end - offset)
+                # Hex-heavy log lines compress well, but each response is
+                # compressed afresh; tiny deltas go as-is and large replays
+                # stay on the zero-copy sendfile path
+                encoding = None
+                if compress_tools.MIN_SIZE <= length <= compress_tools.MAX_SIZE:
+                    encoding = compress_tools.negotiate(self.headers.get("Accept-Encoding"))
+                if encoding:
+                    f.seek(offset)
+                    body = compress_tools.compress(f.read(length), encoding)
 
-            start_idx = 0
-            matched = False
-            if last_hash:
-                # Look for a line whose last space-delimited token equals last_hash
-                for i, line in enumerate(lines):
-                    tok = line.strip().split()
-                    if tok:
-                        maybe_hash = tok[-1]
-                        if maybe_hash == last_hash:
-                            start_idx = i + 1
-                            matched = True
-                            break
-
-            body_lines = lines[start_idx:]
-            body = "".join(body_lines).encode("utf-8")
-
-            self.send_response(200)
-            self.send_header("Content-Type", "text/plain; charset=utf-8")
-            self.send_header(
-                "Content-Disposition", f"attachment; filename=changes_{data_type}.log"
-            )
-            # Indicate whether this is a delta (hash matched) or full replay
-            self.send_header("X-Delta", "delta" if matched else "full")
-            self.send_header("Content-Length", str(len(body)))
-            self.end_headers()
-            self.wfile.write(body)
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; charset=utf-8")
+                self.send_header(
+                    "Content-Disposition", f"attachment; filename=changes_{data_type}.log"
+                )
+                # Indicate whether this is a delta (hash matched) or full replay
+                self.send_header("X-Delta", "delta" if matched else "full")
+                self.send_header("Vary", "Accept-Encoding")
+                if encoding:
+                    self.send_header("Content-Encoding", encoding)
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+                    return
+                self.send_header("Content-Length", str(length))
+                self.end_headers()
+                self.wfile.flush()
+                if length:
+                    # Kernel-side copy via os.sendfile where supported;
+                    # socket.sendfile falls back to plain sends otherwise.
+                    sent = self.connection.sendfile(f, offset, length)
+                    if sent < length:
+                        # Log truncated mid-response; the body is short
+                        self.close_connection = True
+            return
+
+        if path == "/latest_hash":
+            data_type = (qs.get("data_type") or [None])[0]
+            if not data_type or not (data_type.isascii() and data_type.isalnum()):
+                self._send_json(400, {"error": "Invalid or missing data_type (alphanumeric only)"})
+                return
+            log_path = os.path.join(_DATA_DIR, data_type, "changes.log")
+            try:
+                f = open(log_path, "rb")
+            except FileNotFoundError:
+                self._send_json(404, {"error": "changes.log not found for data_type"})
+                return
+            with f:
+                tip = _changes_log_index(f, data_type).last_hash
+            self._send_json(200, {"data_type": data_type, "hash": tip})
             return
 
         if path == "/encryption_type":
             data_type = (qs.get("data_type") or [None])[0]
-            if not data_type or not ALNUM_RE.fullmatch(data_type):
+            if not data_type or not (data_type.isascii() and data_type.isalnum()):
                 self._send_json(400, {"error": "Invalid or missing data_type (alphanumeric only)"})
                 return
 
             # Verify the data_type exists by checking schema
-            schema_path = os.path.join(base_dir, "schemas", data_type, "schema.json")
-            if not os.path.exists(schema_path):
+            if not _is_known_data_type(data_type):
                 self._send_json(404, {"error": "Unknown data_type"})
                 return
 
@@ -110,66 +306,88 @@ class SyncHandler(BaseHTTPRequestHandler):
     def do_POST(self):  # noqa: N802
         parsed = urlparse(self.path)
         path = parsed.path.rstrip("/") or "/"
-        base_dir = os.path.dirname(os.path.abspath(__file__))
 
         if path == "/oprf_evaluate":
             # Expect JSON: {"data_type": "name", "blinded": "hex-32-bytes"}
+            # or, for a batch, "blinded": ["hex-32-bytes", ...]
             try:
                 length = int(self.headers.get("Content-Length", "0"))
             except ValueError:
+                length = -1
+            if length < 0:
+                # Unknown body length: the connection cannot be reused safely
+                self.close_connection = True
                 self._send_json(411, {"error": "Missing Content-Length"})
                 return
+            if length > MAX_OPRF_BODY:
+                # Refused unread, so the connection cannot be reused either
+                self.close_connection = True
+                self._send_json(413, {"error": f"Request body too large (max {MAX_OPRF_BODY} bytes)"})
+                return
+            # Read the whole body before any reply so a kept-alive connection
+            # stays in sync with the next request
             body = self.rfile.read(length)
             try:
-                payload = json.loads(body.decode("utf-8"))
+                payload = json_tools.loads(body)
             except Exception:
                 self._send_json(400, {"error": "Invalid JSON"})
                 return
+            if not isinstance(payload, dict):
+                self._send_json(400, {"error": "Invalid JSON"})
+                return
 
             data_type = payload.get("data_type")
             blinded_hex = payload.get("blinded")
-            if not data_type or not ALNUM_RE.fullmatch(data_type):
+            if not isinstance(data_type, str) or not (data_type.isascii() and data_type.isalnum()):
                 self._send_json(400, {"error": "Invalid or missing data_type"})
                 return
-            if not isinstance(blinded_hex, str):
+            batch = isinstance(blinded_hex, list)
+            blinded_items = blinded_hex if batch else [blinded_hex]
+            if not blinded_items or not all(isinstance(h, str) for h in blinded_items):
                 self._send_json(400, {"error": "Missing blinded"})
                 return
-            try:
-                blinded = bytes.fromhex(blinded_hex)
-            except ValueError:
-                self._send_json(400, {"error": "Invalid blinded hex"})
-                return
-            if len(blinded) != 32:
-                self._send_json(400, {"error": "Blinded point must be 32 bytes"})
+            if len(blinded_items) > MAX_OPRF_BATCH:
+                self._send_json(400, {"error": f"Too many blinded points (max {MAX_OPRF_BATCH})"})
                 return
+            blinded_points = []
+            for h in blinded_items:
+                try:
+                    blinded = bytes.fromhex(h)
+                except ValueError:
+                    self._send_json(400, {"error": "Invalid blinded hex"})
+                    return
+                if len(blinded) != 32:
+                    self._send_json(400, {"error": "Blinded point must be 32 bytes"})
+                    return
+                blinded_points.append(blinded)
 
             # Validate schema and algorithm
-            schema_path = os.path.join(base_dir, "schemas", data_type, "schema.json")
-            if not os.path.exists(schema_path):
+            if not _is_known_data_type(data_type):
                 self._send_json(404, {"error": "Unknown data_type"})
                 return
 
-            # Load server private key
-            key_path = os.path.join(base_dir, "secrets", data_type, "private.key")
-            if not os.path.exists(key_path):
+            # Load server private key (cached; one stat per request)
+            try:
+                sk = _get_sk(data_type)
+            except FileNotFoundError:
                 self._send_json(404, {"error": "Missing private key"})
                 return
-            try:
-                with open(key_path, "rb") as f:
-                    sk = f.read()
             except OSError as e:
                 self._send_json(500, {"error": f"Failed to read key: {e}"})
                 return
 
             try:
-                evaluated = crypto_tools.evaluate_blinded_point(sk, blinded)
+                evaluated = [q.hex() for q in crypto_tools.evaluate_blinded_points_batch(sk, blinded_points)]
             except Exception as e:
                 self._send_json(500, {"error": f"Evaluation failed: {e}"})
                 return
 
-            self._send_json(200, {"evaluated": evaluated.hex()})
+            self._send_json(200, {"evaluated": evaluated if batch else evaluated[0]})
             return
 
+        # The body was not read; drop the connection rather than parse it as
+        # the next request
+        self.close_connection = True
         self._send_json(404, {"error": "Not Found"})
 
 
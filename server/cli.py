@@ -1,9 +1,8 @@
 import argparse
-import json
-import shutil
 import os
 import re
 import sys
+import tempfile
 from typing import Optional
 
 # Ensure the workspace root (parent of this server dir) is on sys.path so we can
@@ -13,11 +12,38 @@ _WORKSPACE_ROOT = os.path.dirname(_THIS_DIR)
 if _WORKSPACE_ROOT not in sys.path:
     sys.path.insert(0, _WORKSPACE_ROOT)
 
-# Import shared crypto tools so server and a future client can share them
-try:
-    from shared import crypto_tools
-except ImportError:  # pragma: no cover - fallback if shared isn't importable
-    crypto_tools = None  # Will be checked at runtime when needed
+# Per-dataset roots, resolved once rather than in every command
+_DATA_DIR = os.path.join(_THIS_DIR, "data")
+_SCHEMAS_DIR = os.path.join(_THIS_DIR, "schemas")
+_SECRETS_DIR = os.path.join(_THIS_DIR, "secrets")
+
+# Heavier modules (shared.crypto_tools with ctypes/libsodium, json_tools,
+# shutil) are imported inside the commands that need them, so --help,
+# purge_data and start_server do not pay for them at startup.
+
+# Compiled once at import instead of looked up in re's cache per validation
+_REKEY_RE = re.compile(r"(\d+)d")
+
+
+def _write_atomic(path: str, data: bytes, mode: int = 0o666) -> None:
+    """Write data to a fresh sibling temp file with ``mode`` (less the umask) and rename it into place."""
+    # mkstemp never reuses a leftover file, so its mode is always ours to set
+    fd, tmp_path = tempfile.mkstemp(
+        dir=os.path.dirname(path) or ".", prefix=os.path.basename(path) + ".", suffix=".tmp"
+    )
+    try:
+        with os.fdopen(fd, "wb") as f:
+            umask = os.umask(0)
+            os.umask(umask)
+            os.fchmod(f.fileno(), mode & ~umask)
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except FileNotFoundError:
+            pass
+        raise
 
 
 def create_source(args: argparse.Namespace) -> None:
@@ -32,10 +58,9 @@ def create_source(args: argparse.Namespace) -> None:
     supported_algorithm = args.supported_algorithm
     rekey_interval = args.rekey_interval
 
-    base_dir = os.path.dirname(os.path.abspath(__file__))
-    target_dir = os.path.join(base_dir, "schemas", data_name)
+    target_dir = os.path.join(_SCHEMAS_DIR, data_name)
     schema_path = os.path.join(target_dir, "schema.json")
-    secrets_dir = os.path.join(base_dir, "secrets", data_name)
+    secrets_dir = os.path.join(_SECRETS_DIR, data_name)
     key_path = os.path.join(secrets_dir, "private.key")
 
     # If removal was requested, delete files created by create_source and return
@@ -71,6 +96,8 @@ def create_source(args: argparse.Namespace) -> None:
         )
         sys.exit(1)
 
+    from shared import json_tools
+
     os.makedirs(target_dir, exist_ok=True)
     schema = {
         "data_name": data_name,
@@ -79,9 +106,7 @@ def create_source(args: argparse.Namespace) -> None:
     }
 
     try:
-        with open(schema_path, "w", encoding="utf-8") as f:
-            json.dump(schema, f, indent=2)
-            f.write("\n")
+        _write_atomic(schema_path, json_tools.dumps_indented(schema) + b"\n")
     except OSError as e:
         print(f"Error writing schema: {e}", file=sys.stderr)
         sys.exit(1)
@@ -93,37 +118,31 @@ def create_source(args: argparse.Namespace) -> None:
 
     try:
         if supported_algorithm == "classic":
-            if crypto_tools is None:
+            try:
+                from shared import crypto_tools
+            except ImportError:  # pragma: no cover - shared isn't importable
                 print(
                     "Crypto tools not available; cannot generate ristretto255 key",
                     file=sys.stderr,
                 )
                 sys.exit(1)
             key_bytes = crypto_tools.generate_ristretto255_private_key()
-            with open(key_path, "wb") as f:
-                f.write(key_bytes)
         else:  # ot
-            placeholder = (
+            key_bytes = (
                 b"ot-placeholder-key\n"  # Placeholder until OT implementation is added
             )
-            with open(key_path, "wb") as f:
-                f.write(placeholder)
+        # Created owner-only from the start, so no separate chmod is needed
+        _write_atomic(key_path, key_bytes, 0o600)
     except OSError as e:
         print(f"Error writing private key: {e}", file=sys.stderr)
         sys.exit(1)
 
-    # Best-effort restrict permissions on the key file
-    try:
-        os.chmod(key_path, 0o600)
-    except OSError:
-        pass
-
     print(f"Created {key_path}")
 
 
 def data_name_type(value: str) -> str:
     """Validate that data_name is strictly alphanumeric (A–Z, a–z, 0–9)."""
-    if not re.fullmatch(r"[A-Za-z0-9]+", value):
+    if not (value.isascii() and value.isalnum()):
         raise argparse.ArgumentTypeError(
             "data_name must be alphanumeric only (A–Z, a–z, 0–9)"
         )
@@ -133,7 +152,7 @@ def data_name_type(value: str) -> str:
 def rekey_interval_type(value: str) -> str:
     """Validate rekey interval as '<positive_integer>d' and normalize it."""
     value = value.strip()
-    m = re.fullmatch(r"(\d+)d", value)
+    m = _REKEY_RE.fullmatch(value)
     if not m:
         raise argparse.ArgumentTypeError(
             "--rekey-interval must be a positive integer followed by 'd' (e.g., 1d, 7d)"
@@ -144,13 +163,7 @@ def rekey_interval_type(value: str) -> str:
     return f"{days}d"  # normalize (strip leading zeros/spaces)
 
 
-def build_parser() -> argparse.ArgumentParser:
-    parser = argparse.ArgumentParser(
-        prog="server-cli", description="Simple server CLI tool"
-    )
-    subparsers = parser.add_subparsers(dest="command", required=True)
-
-    # create_source command
+def _add_create_source(subparsers) -> None:
     p_create = subparsers.add_parser(
         "create_source",
         help="Create a source schema under server/schemas/<data_name>/",
@@ -184,7 +197,8 @@ def build_parser() -> argparse.ArgumentParser:
     )
     p_create.set_defaults(func=create_source)
 
-    # sync command
+
+def _add_sync(subparsers) -> None:
     p_sync = subparsers.add_parser(
         "sync",
         help=(
@@ -210,7 +224,8 @@ def build_parser() -> argparse.ArgumentParser:
 
     p_sync.set_defaults(func=_sync_entry)
 
-    # rekey command
+
+def _add_rekey(subparsers) -> None:
     p_rekey = subparsers.add_parser(
         "rekey",
         help=(
@@ -236,7 +251,8 @@ def build_parser() -> argparse.ArgumentParser:
 
     p_rekey.set_defaults(func=_rekey_entry)
 
-    # purge_data command
+
+def _add_purge_data(subparsers) -> None:
     p_purge = subparsers.add_parser(
         "purge_data",
         help="Remove all server files for a dataset under server/data/<data_name>",
@@ -248,15 +264,17 @@ def build_parser() -> argparse.ArgumentParser:
     )
 
     def _purge_entry(args: argparse.Namespace) -> None:
-        base_dir = os.path.dirname(os.path.abspath(__file__))
-        out_dir = os.path.join(base_dir, "data", args.data_name)
+        import shutil
+
+        out_dir = os.path.join(_DATA_DIR, args.data_name)
         if os.path.isdir(out_dir):
             shutil.rmtree(out_dir, ignore_errors=True)
         print(f"Purged server dataset directory: {out_dir}")
 
     p_purge.set_defaults(func=_purge_entry)
 
-    # start_server command
+
+def _add_start_server(subparsers) -> None:
     p_srv = subparsers.add_parser(
         "start_server",
         help="Start a simple HTTP API server with /sync_data endpoint",
@@ -273,11 +291,45 @@ def build_parser() -> argparse.ArgumentParser:
 
     p_srv.set_defaults(func=_start_server_entry)
 
+
+# Subcommand name -> function registering its parser, in help order
+_SUBCOMMANDS = {
+    "create_source": _add_create_source,
+    "sync": _add_sync,
+    "rekey": _add_rekey,
+    "purge_data": _add_purge_data,
+    "start_server": _add_start_server,
+}
+
+
+def _sniff_subcommand(argv: list[str]) -> Optional[str]:
+    """Return the subcommand named in ``argv`` (the first positional), if known."""
+    for tok in argv:
+        if not tok.startswith("-"):
+            return tok if tok in _SUBCOMMANDS else None
+    return None
+
+
+def build_parser(only: Optional[str] = None) -> argparse.ArgumentParser:
+    """Build the CLI parser; with ``only``, register just that subcommand."""
+    parser = argparse.ArgumentParser(
+        prog="server-cli", description="Simple server CLI tool"
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    if only is not None:
+        _SUBCOMMANDS[only](subparsers)
+    else:
+        for add in _SUBCOMMANDS.values():
+            add(subparsers)
     return parser
 
 
 def main(argv=None) -> int:
-    parser = build_parser()
+    if argv is None:
+        argv = sys.argv[1:]
+    # Only the requested subcommand's parser is built; top-level --help and
+    # unknown commands fall back to the full parser for complete output.
+    parser = build_parser(_sniff_subcommand(argv))
     args = parser.parse_args(argv)
     if hasattr(args, "func"):
         args.func(args)
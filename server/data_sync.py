@@ -1,7 +1,8 @@
 import os
 import sys
 import hashlib
-from typing import Iterable, Tuple, Iterator, Dict, Any, List, Optional, Tuple as Tup
+from itertools import islice
+from typing import Iterable, Tuple, Iterator, Dict, List, Optional, Tuple as Tup
 
 # Ensure we can import the shared crypto package when invoked via CLI
 _THIS_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -9,7 +10,15 @@ _WORKSPACE_ROOT = os.path.dirname(_THIS_DIR)
 if _WORKSPACE_ROOT not in sys.path:
     sys.path.insert(0, _WORKSPACE_ROOT)
 
-from shared import crypto_tools
+# Per-dataset roots, resolved once rather than in every call
+_DATA_DIR = os.path.join(_THIS_DIR, "data")
+_SCHEMAS_DIR = os.path.join(_THIS_DIR, "schemas")
+_SECRETS_DIR = os.path.join(_THIS_DIR, "secrets")
+
+from shared import crypto_tools, json_tools
+
+# IOCs evaluated per batch while rekeying; bounds memory for large sources
+_REKEY_CHUNK = 4096
 
 
 def _iter_iocs_from_file(path: str) -> Iterable[Tuple[int, str, str]]:
@@ -18,21 +27,21 @@ def _iter_iocs_from_file(path: str) -> Iterable[Tuple[int, str, str]]:
     Each line must be of the form: '<ioc>,{...metadata...}'
     Returns the IOC (left side of the first comma) and the raw metadata string
     (right side of the first comma) with surrounding whitespace trimmed.
-    Blank lines are skipped.
+    Blank lines are skipped. The file is read through a 1 MiB buffer so large
+    sources take few read() calls.
     """
-    with open(path, "r", encoding="utf-8") as f:
+    with open(path, "r", encoding="utf-8", buffering=1 << 20) as f:
         for idx, raw in enumerate(f, start=1):
             line = raw.strip()
             if not line:
                 continue
-            if "," not in line:
+            ioc_part, sep, meta_part = line.partition(",")
+            if not sep:
                 # Skip malformed lines; caller can decide how to handle
                 continue
-            ioc_part, meta_part = line.split(",", 1)
             ioc = ioc_part.strip()
-            metadata = meta_part.strip()
             if ioc:
-                yield idx, ioc, metadata
+                yield idx, ioc, meta_part.strip()
 
 
 def sync_data(data_name: str, data_source_file: str) -> int:
@@ -41,17 +50,13 @@ def sync_data(data_name: str, data_source_file: str) -> int:
     Returns process exit code (0 on success, non-zero on failure).
     """
     # Load schema
-    schema_path = os.path.join(_THIS_DIR, "schemas", data_name, "schema.json")
-    if not os.path.exists(schema_path):
+    schema_path = os.path.join(_SCHEMAS_DIR, data_name, "schema.json")
+    try:
+        with open(schema_path, "rb") as f:
+            schema = json_tools.loads(f.read())
+    except FileNotFoundError:
         print(f"Schema not found for '{data_name}': {schema_path}", file=sys.stderr)
         return 1
-
-    # Read supported algorithm from schema
-    import json
-
-    try:
-        with open(schema_path, "r", encoding="utf-8") as f:
-            schema = json.load(f)
     except Exception as e:
         print(f"Failed to load schema: {e}", file=sys.stderr)
         return 1
@@ -65,19 +70,19 @@ def sync_data(data_name: str, data_source_file: str) -> int:
         return 2
 
     # Load private key
-    key_path = os.path.join(_THIS_DIR, "secrets", data_name, "private.key")
-    if not os.path.exists(key_path):
-        print(f"Private key not found for '{data_name}': {key_path}", file=sys.stderr)
-        return 1
+    key_path = os.path.join(_SECRETS_DIR, data_name, "private.key")
     try:
         with open(key_path, "rb") as f:
             sk = f.read()
+    except FileNotFoundError:
+        print(f"Private key not found for '{data_name}': {key_path}", file=sys.stderr)
+        return 1
     except OSError as e:
         print(f"Failed to read private key: {e}", file=sys.stderr)
         return 1
 
     # Prepare output directory and file under server/data/<data_name>/
-    out_dir = os.path.join(_THIS_DIR, "data", data_name)
+    out_dir = os.path.join(_DATA_DIR, data_name)
     try:
         os.makedirs(out_dir, exist_ok=True)
     except OSError as e:
@@ -86,65 +91,69 @@ def sync_data(data_name: str, data_source_file: str) -> int:
 
     # index.csv persists server-side IOC -> values; evaluations.txt is redundant
     index_path = os.path.join(out_dir, "index.csv")
-    index_path = os.path.join(out_dir, "index.csv")
     log_path = os.path.join(out_dir, "changes.log")
 
-    # Load current IOCs from source file
+    # Load existing evaluations index if present (server-side mapping of IOC->hex)
+    existing_order: list[str] = []  # preserve order
+    # Map: IOC -> (oprf_hex, nonce_hex|None, ct_hex|None); a plain tuple per
+    # entry rather than a dict keeps large indexes compact
+    existing_map: Dict[str, Tup[str, Optional[str], Optional[str]]] = {}
+    try:
+        with open(index_path, "r", encoding="utf-8") as f:
+            for raw in f:
+                line = raw.strip()
+                if not line or "," not in line:
+                    continue
+                parts = [p.strip() for p in line.split(",")]
+                ioc = parts[0]
+                hexval = parts[1] if len(parts) > 1 else ""
+                nonce = parts[2] if len(parts) > 2 else None
+                ct = parts[3] if len(parts) > 3 else None
+                if not ioc:
+                    continue
+                # A repeated row replaces the entry but keeps its first
+                # position, so the order stays duplicate-free
+                if ioc not in existing_map:
+                    existing_order.append(ioc)
+                existing_map[ioc] = (hexval, nonce, ct)
+    except FileNotFoundError:
+        pass  # first sync: no index yet
+    except OSError as e:
+        print(f"Failed to read existing evaluations index: {e}", file=sys.stderr)
+        return 1
+
+    # Stream the source file against the index. Only additions and upgrades
+    # keep their metadata (ioc -> metadata, in source order; the last line for
+    # a repeated IOC wins); known IOCs are just marked as still present.
+    to_add: Dict[str, str] = {}
+    to_upgrade: Dict[str, str] = {}  # entries missing encrypted metadata
+    present: set[str] = set()
     try:
-        current_iocs: list[str] = []
-        current_meta: Dict[str, str] = {}
         for _, ioc, metadata in _iter_iocs_from_file(data_source_file):
-            current_iocs.append(ioc)
-            current_meta[ioc] = metadata
+            entry = existing_map.get(ioc)
+            if entry is None:
+                to_add[ioc] = metadata
+            else:
+                present.add(ioc)
+                if entry[1] is None or entry[2] is None:
+                    to_upgrade[ioc] = metadata
     except FileNotFoundError:
         print(f"Source file not found: {data_source_file}", file=sys.stderr)
         return 1
-    current_set = set(current_iocs)
-
-    # Load existing evaluations index if present (server-side mapping of IOC->hex)
-    existing_order: list[str] = []  # preserve order
-    # Map: IOC -> { 'oprf': hex, 'nonce': hex|None, 'ct': hex|None }
-    existing_map: Dict[str, Dict[str, Any]] = {}
-    if os.path.exists(index_path):
-        try:
-            with open(index_path, "r", encoding="utf-8") as f:
-                for raw in f:
-                    line = raw.strip()
-                    if not line or "," not in line:
-                        continue
-                    parts = [p.strip() for p in line.split(",")]
-                    ioc = parts[0]
-                    hexval = parts[1] if len(parts) > 1 else ""
-                    nonce = parts[2] if len(parts) > 2 else None
-                    ct = parts[3] if len(parts) > 3 else None
-                    if not ioc:
-                        continue
-                    existing_order.append(ioc)
-                    existing_map[ioc] = {"oprf": hexval, "nonce": nonce, "ct": ct}
-        except OSError as e:
-            print(f"Failed to read existing evaluations index: {e}", file=sys.stderr)
-            return 1
-
-    # Determine changes
-    to_remove = [ioc for ioc in existing_order if ioc not in current_set]
-    to_add = [ioc for ioc in current_iocs if ioc not in existing_map]
-    # Upgrade entries missing encrypted metadata
-    to_upgrade = [
-        ioc for ioc in current_iocs
-        if ioc in existing_map and (existing_map[ioc].get("nonce") is None or existing_map[ioc].get("ct") is None)
-    ]
+    to_remove = [ioc for ioc in existing_order if ioc not in present]
 
     # Compute evaluations for additions
     try:
-        for ioc in to_add + to_upgrade:
-            # Compute OPRF and encryption of metadata
-            prf_bytes = None
-            nonce = None
-            ct = None
-            prf_bytes, nonce, ct = crypto_tools.evaluate_and_encrypt_metadata(
-                sk, ioc.encode("utf-8"), data_name, current_meta.get(ioc, "").encode("utf-8")
-            )
-            existing_map[ioc] = {"oprf": prf_bytes.hex(), "nonce": nonce.hex(), "ct": ct.hex()}
+        pending = list(to_add) + list(to_upgrade)
+        # Compute OPRF and encryption of metadata in one batch
+        evaluated = crypto_tools.evaluate_and_encrypt_metadata_batch(
+            sk,
+            [ioc.encode("utf-8") for ioc in pending],
+            data_name,
+            [m.encode("utf-8") for m in (*to_add.values(), *to_upgrade.values())],
+        )
+        for ioc, (prf_bytes, nonce, ct) in zip(pending, evaluated):
+            existing_map[ioc] = (prf_bytes.hex(), nonce.hex(), ct.hex())
     except crypto_tools.MissingLibraryError as e:
         print(str(e), file=sys.stderr)
         return 3
@@ -152,29 +161,27 @@ def sync_data(data_name: str, data_source_file: str) -> int:
         print(f"Error computing evaluations: {e}", file=sys.stderr)
         return 1
 
-    # Snapshot previous values for removal logging, then apply removals
-    prev_map = {k: v.copy() for k, v in existing_map.items()}
-    for ioc in to_remove:
-        existing_map.pop(ioc, None)
+    # Keep the removed entries for removal logging, then apply removals.
+    # Entries are replaced rather than mutated above, so no copy is needed.
+    removed_entries = {ioc: existing_map.pop(ioc) for ioc in to_remove if ioc in existing_map}
 
     # Build new order: keep existing order minus removals, then append additions in source order
+    # (additions are new IOCs, so they never collide with the kept ones)
     new_order = [ioc for ioc in existing_order if ioc in existing_map]
-    for ioc in current_iocs:
-        if ioc not in new_order:
-            new_order.append(ioc)
+    new_order.extend(to_add)
 
     # Write back index (ioc,hex[,nonce,ct]); skip evaluations.txt to reduce redundancy
     try:
-        with open(index_path, "w", encoding="utf-8") as idxf:
-            for ioc in new_order:
-                entry = existing_map[ioc]
-                hexval = entry["oprf"]
-                nonce = entry.get("nonce")
-                ct = entry.get("ct")
-                if nonce is None or ct is None:
-                    idxf.write(f"{ioc},{hexval}\n")
-                else:
-                    idxf.write(f"{ioc},{hexval},{nonce},{ct}\n")
+        rows = []
+        for ioc in new_order:
+            hexval, nonce, ct = existing_map[ioc]
+            if nonce is None or ct is None:
+                rows.append(f"{ioc},{hexval}\n")
+            else:
+                rows.append(f"{ioc},{hexval},{nonce},{ct}\n")
+        # One write of the whole file instead of one call per row
+        with open(index_path, "wb") as idxf:
+            idxf.write("".join(rows).encode("utf-8"))
     except OSError as e:
         print(f"Failed to write index file '{index_path}': {e}", file=sys.stderr)
         return 1
@@ -184,18 +191,11 @@ def sync_data(data_name: str, data_source_file: str) -> int:
     try:
         events: List[Tup[str, Optional[str], Optional[str]]] = []
         for ioc in to_add:
-            op = existing_map[ioc]
-            enc_meta = None
-            if op.get("nonce") and op.get("ct"):
-                enc_meta = f"{op['nonce']}:{op['ct']}"
-            events.append(("ADDED", op["oprf"], enc_meta))
+            hexval, nonce, ct = existing_map[ioc]
+            events.append(("ADDED", hexval, f"{nonce}:{ct}" if nonce and ct else None))
         for ioc in to_remove:
-            old_entry = prev_map.get(ioc)
-            old_hex = old_entry.get("oprf") if old_entry else None
-            old_enc = None
-            if old_entry and old_entry.get("nonce") and old_entry.get("ct"):
-                old_enc = f"{old_entry['nonce']}:{old_entry['ct']}"
-            events.append(("REMOVED", old_hex, old_enc))
+            hexval, nonce, ct = removed_entries[ioc]
+            events.append(("REMOVED", hexval, f"{nonce}:{ct}" if nonce and ct else None))
         _append_change_events(log_path, events)
     except OSError as e:
         print(f"Failed to append change log '{log_path}': {e}", file=sys.stderr)
@@ -211,22 +211,20 @@ def rekey_data(data_name: str, data_source_file: str) -> int:
 
     Steps:
     1) Validate schema and algorithm (classic only)
-    2) Generate and store a new 32-byte private key
+    2) Generate a new 32-byte private key
     3) Recompute OPRF outputs for all IOCs in the source file
     4) Overwrite evaluations.txt with new values
-    5) Truncate changes.log to empty
+    5) Rewrite changes.log with ADDED events for the new evaluations
+    6) Store the new key once the index and log built with it are in place
     """
     # Load schema
-    schema_path = os.path.join(_THIS_DIR, "schemas", data_name, "schema.json")
-    if not os.path.exists(schema_path):
+    schema_path = os.path.join(_SCHEMAS_DIR, data_name, "schema.json")
+    try:
+        with open(schema_path, "rb") as f:
+            schema = json_tools.loads(f.read())
+    except FileNotFoundError:
         print(f"Schema not found for '{data_name}': {schema_path}", file=sys.stderr)
         return 1
-
-    import json
-
-    try:
-        with open(schema_path, "r", encoding="utf-8") as f:
-            schema = json.load(f)
     except Exception as e:
         print(f"Failed to load schema: {e}", file=sys.stderr)
         return 1
@@ -239,24 +237,15 @@ def rekey_data(data_name: str, data_source_file: str) -> int:
         print(f"Unsupported algorithm in schema: {algo}", file=sys.stderr)
         return 2
 
-    # Generate and write new private key
-    secrets_dir = os.path.join(_THIS_DIR, "secrets", data_name)
-    os.makedirs(secrets_dir, exist_ok=True)
+    # Generate the new private key; it is written only once the index and
+    # log built with it are in place, so a failed rekey keeps the old key
+    # consistent with the old data
+    secrets_dir = os.path.join(_SECRETS_DIR, data_name)
     key_path = os.path.join(secrets_dir, "private.key")
-    try:
-        sk = crypto_tools.generate_ristretto255_private_key()
-        with open(key_path, "wb") as f:
-            f.write(sk)
-        try:
-            os.chmod(key_path, 0o600)
-        except OSError:
-            pass
-    except OSError as e:
-        print(f"Failed to write new private key: {e}", file=sys.stderr)
-        return 1
+    sk = crypto_tools.generate_ristretto255_private_key()
 
     # Prepare output directory and files
-    out_dir = os.path.join(_THIS_DIR, "data", data_name)
+    out_dir = os.path.join(_DATA_DIR, data_name)
     try:
         os.makedirs(out_dir, exist_ok=True)
     except OSError as e:
@@ -266,60 +255,142 @@ def rekey_data(data_name: str, data_source_file: str) -> int:
     index_path = os.path.join(out_dir, "index.csv")
     log_path = os.path.join(out_dir, "changes.log")
 
-    # Load current IOCs and metadata from source file
+    # Read the first chunk up front so a missing source is reported before the
+    # index and change log are touched
+    source = _iter_iocs_from_file(data_source_file)
     try:
-        current_iocs: list[str] = []
-        current_meta: Dict[str, str] = {}
-        for _, ioc, metadata in _iter_iocs_from_file(data_source_file):
-            current_iocs.append(ioc)
-            current_meta[ioc] = metadata
+        chunk = list(islice(source, _REKEY_CHUNK))
     except FileNotFoundError:
         print(f"Source file not found: {data_source_file}", file=sys.stderr)
         return 1
 
-    # Recompute and overwrite index (ioc, prf_hex, nonce_hex, ct_hex)
+    # Stream the source through evaluation in chunks: each chunk is written to
+    # the new index and logged as ADDED events (with cumulative hash chain)
+    # before the next is read, so memory stays bounded by the chunk size. Both
+    # files are built next to their targets and swapped in only once complete,
+    # the index first, so a failure leaves the old index and log in place.
+    tmp_index_path = index_path + ".tmp"
+    tmp_log_path = log_path + ".tmp"
     try:
-        added_entries = []  # collect (ioc, prf_hex, nonce_hex, ct_hex) for logging
-        with open(index_path, "w", encoding="utf-8") as idxf:
-            for ioc in current_iocs:
-                prf_bytes, nonce, ct = crypto_tools.evaluate_and_encrypt_metadata(
-                    sk, ioc.encode("utf-8"), data_name, current_meta.get(ioc, "").encode("utf-8")
+        head = b"\x00" * 64
+        with open(tmp_index_path, "wb", buffering=1 << 20) as idxf, \
+                open(tmp_log_path, "wb", buffering=1 << 20) as logf:
+            while chunk:
+                evaluated = crypto_tools.evaluate_and_encrypt_metadata_batch(
+                    sk,
+                    [ioc.encode("utf-8") for _, ioc, _ in chunk],
+                    data_name,
+                    [metadata.encode("utf-8") for _, _, metadata in chunk],
                 )
-                hexval = prf_bytes.hex()
-                nonce_hex = nonce.hex()
-                ct_hex = ct.hex()
-                idxf.write(f"{ioc},{hexval},{nonce_hex},{ct_hex}\n")
-                added_entries.append((ioc, hexval, nonce_hex, ct_hex))
+                rows = []
+                rekey_events: List[Tup[str, Optional[str], Optional[str]]] = []
+                for (_, ioc, _), (prf_bytes, nonce, ct) in zip(chunk, evaluated):
+                    hexval = prf_bytes.hex()
+                    nonce_hex = nonce.hex()
+                    ct_hex = ct.hex()
+                    rows.append(f"{ioc},{hexval},{nonce_hex},{ct_hex}\n")
+                    rekey_events.append(("ADDED", hexval, f"{nonce_hex}:{ct_hex}"))
+                idxf.write("".join(rows).encode("utf-8"))
+                head, data = _chain_lines(head, rekey_events)
+                logf.write(data)
+                chunk = list(islice(source, _REKEY_CHUNK))
+            log_size = logf.tell()
+        os.replace(tmp_index_path, index_path)
+        # The rekeyed log usually has the old size, so a stale head would
+        # still look valid; drop it before the swap
+        _HEAD_CACHE.pop(log_path, None)
+        try:
+            os.unlink(log_path + ".head")
+        except FileNotFoundError:
+            pass
+        os.replace(tmp_log_path, log_path)
+        _write_head(log_path, head, log_size)
+        from server.cli import _write_atomic
+
+        os.makedirs(secrets_dir, exist_ok=True)
+        _write_atomic(key_path, sk, 0o600)
     except crypto_tools.MissingLibraryError as e:
         print(str(e), file=sys.stderr)
         return 3
     except OSError as e:
-        print(f"Failed to write index file '{index_path}': {e}", file=sys.stderr)
+        print(f"Failed to rewrite index/change log/key for '{data_name}': {e}", file=sys.stderr)
         return 1
     except Exception as e:
         print(f"Error during rekey evaluation: {e}", file=sys.stderr)
         return 1
-
-    # Refresh changes log to list additions for all elements post-rekey
-    try:
-        # Truncate and then append ADDED events with cumulative hash chain
-        with open(log_path, "w", encoding="utf-8"):
-            pass
-        rekey_events: List[Tup[str, Optional[str], Optional[str]]] = []
-        for ioc, hexval, nonce_hex, ct_hex in added_entries:
-            enc_meta = f"{nonce_hex}:{ct_hex}" if nonce_hex and ct_hex else None
-            rekey_events.append(("ADDED", hexval, enc_meta))
-        _append_change_events(log_path, rekey_events)
-    except OSError as e:
-        print(f"Failed to write change log '{log_path}': {e}", file=sys.stderr)
-        return 1
+    finally:
+        for tmp_path in (tmp_index_path, tmp_log_path):
+            try:
+                os.unlink(tmp_path)
+            except FileNotFoundError:
+                pass
 
     print(f"Rekey complete. Updated key: {key_path}")
     print(f"Rewrote index: {index_path}")
-    print(f"Cleared change log: {log_path}")
+    print(f"Rewrote change log: {log_path}")
     return 0
 
 
+# The chain head (last hash in changes.log) is kept in changes.log.head as
+# "<HASH_HEX> <LOG_SIZE>" so appends need not rescan the log. The head is only
+# trusted while the log still has the recorded size; anything else (manual
+# edits, a crash between the two writes) falls back to a scan of the log.
+# Rekey removes the head before it swaps in the rewritten log.
+_HEAD_CACHE: Dict[str, Tup[int, bytes]] = {}
+
+# Hash-chain field separator and the event labels it accepts
+_SEP = b"|"
+_EVENT_LABELS = {"ADDED": b"ADDED", "REMOVED": b"REMOVED"}
+
+
+def _scan_last_hash(logf) -> bytes:
+    """Return the hash ending the last non-empty line of the open log (zeros if none)."""
+    prev_hash = b"\x00" * 64
+    logf.seek(0)
+    last = None
+    for raw in logf:
+        line = raw.strip()
+        if line:
+            last = line
+    if last:
+        last = last.decode("utf-8", "replace")
+        # Tokenize by whitespace first; fallback to comma
+        tokens = last.split()
+        if len(tokens) >= 2:
+            last_hex = tokens[-1]
+        else:
+            parts = last.rsplit(",", 1)
+            last_hex = parts[-1].strip() if len(parts) > 1 else ""
+        if len(last_hex) in (64, 128):
+            try:
+                prev_hash = bytes.fromhex(last_hex)
+            except ValueError:
+                prev_hash = b"\x00" * 64
+    return prev_hash
+
+
+def _read_head(log_path: str, size: int) -> Optional[bytes]:
+    cached = _HEAD_CACHE.get(log_path)
+    if cached is not None and cached[0] == size:
+        return cached[1]
+    try:
+        with open(log_path + ".head", "r", encoding="utf-8") as f:
+            head_hex, size_s = f.read().split()
+        if int(size_s) != size or len(head_hex) not in (64, 128):
+            return None
+        return bytes.fromhex(head_hex)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_head(log_path: str, head: bytes, size: int) -> None:
+    tmp_path = log_path + ".head.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(f"{head.hex()} {size}\n")
+    os.replace(tmp_path, log_path + ".head")
+    _HEAD_CACHE[log_path] = (size, head)
+
+
 def _append_change_events(log_path: str, events: List[Tup[str, Optional[str], Optional[str]]]) -> None:
     """Append change events to the log with a cumulative SHA-512 hash chain.
 
@@ -333,44 +404,44 @@ def _append_change_events(log_path: str, events: List[Tup[str, Optional[str], Op
 
     The chain seeds prev_hash = 64 zero bytes when the log is empty. For
     backward-compat, if the last existing line used the old comma-separated
-    format, we still extract its trailing hash token if present.
+    format, we still extract its trailing hash token if present. The head is
+    normally read from changes.log.head rather than by scanning the log.
     """
-    prev_hash = b"\x00" * 64
-    # Attempt to read the last hash from the existing log
-    if os.path.exists(log_path):
-        try:
-            with open(log_path, "r", encoding="utf-8") as f:
-                last = None
-                for line in f:
-                    line = line.strip()
-                    if not line:
-                        continue
-                    last = line
-                if last:
-                    # Tokenize by whitespace first; fallback to comma
-                    tokens = last.split()
-                    if len(tokens) >= 2:
-                        last_hex = tokens[-1]
-                    else:
-                        parts = last.rsplit(",", 1)
-                        last_hex = parts[-1].strip() if len(parts) > 1 else ""
-                    if len(last_hex) in (64, 128):
-                        try:
-                            prev_hash = bytes.fromhex(last_hex)
-                        except ValueError:
-                            prev_hash = b"\x00" * 64
-        except OSError:
-            pass
-
-    with open(log_path, "a", encoding="utf-8") as logf:
-        for ev, hexval, enc_meta in events:
-            ev = (ev or "").strip().upper()
-            if ev not in ("ADDED", "REMOVED"):
-                continue
-            hex_part = (hexval or "-")
-            meta_part = (enc_meta or "-")
-            new_hash = hashlib.sha512(
-                prev_hash + b"|" + ev.encode("utf-8") + b"|" + hex_part.encode("utf-8") + b"|" + meta_part.encode("utf-8")
-            ).digest()
-            logf.write(f"{ev} {hex_part} {meta_part} {new_hash.hex()}\n")
-            prev_hash = new_hash
+    # One handle serves both the (rare) tail scan and the append
+    with open(log_path, "a+b") as logf:
+        size = logf.seek(0, os.SEEK_END)
+        if not size:
+            prev_hash = b"\x00" * 64
+        else:
+            prev_hash = _read_head(log_path, size)
+            if prev_hash is None:
+                prev_hash = _scan_last_hash(logf)
+                logf.seek(0, os.SEEK_END)
+        prev_hash, data = _chain_lines(prev_hash, events)
+        # One write for the whole batch rather than one per event
+        logf.write(data)
+        size = logf.tell()
+    _write_head(log_path, prev_hash, size)
+
+
+def _chain_lines(prev_hash: bytes, events: List[Tup[str, Optional[str], Optional[str]]]) -> Tup[bytes, bytes]:
+    """Return (new head, encoded log lines) for events chained onto prev_hash."""
+    lines = []
+    sha512 = hashlib.sha512
+    join_line = b" ".join
+    for ev, hexval, enc_meta in events:
+        ev = (ev or "").strip().upper()
+        ev_bytes = _EVENT_LABELS.get(ev)
+        if ev_bytes is None:
+            continue
+        hex_part = (hexval or "-").encode("utf-8")
+        meta_part = (enc_meta or "-").encode("utf-8")
+        # One join builds the hash input in a single allocation
+        new_hash = sha512(_SEP.join((prev_hash, ev_bytes, hex_part, meta_part))).digest()
+        # The line reuses the encoded fields, so no str line is built or re-encoded
+        lines.append(join_line((ev_bytes, hex_part, meta_part, new_hash.hex().encode("ascii"))))
+        prev_hash = new_hash
+    if not lines:
+        return prev_hash, b""
+    lines.append(b"")
+    return prev_hash, b"\n".join(lines)
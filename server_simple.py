@@ -8,21 +8,32 @@ computes server-side state, and starts the HTTP API.
 Usage:
   python server_simple.py [--host 127.0.0.1] [--port 8000] [--name testSource] [--source path/to/source.txt]
 
-This is a convenience wrapper around `python -m server.cli` commands.
+This is a convenience wrapper around the `python -m server.cli` commands; they
+run in this process rather than as separate Python invocations.
 """
 from __future__ import annotations
 
 import argparse
-import subprocess
 import sys
 from pathlib import Path
 
 
-def run(cmd: list[str]) -> None:
-    print("$", " ".join(cmd))
-    proc = subprocess.run(cmd)
-    if proc.returncode != 0:
-        sys.exit(proc.returncode)
+def cli(argv: list[str]) -> int:
+    """Run ``server.cli`` in-process and return its exit code."""
+    from server.cli import main as cli_main
+
+    try:
+        rc = cli_main(argv)
+    except SystemExit as e:  # commands exit(rc) on failure; argparse on bad input
+        rc = e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+    return rc or 0
+
+
+def run(argv: list[str]) -> None:
+    print("$ python -m server.cli", " ".join(argv))
+    rc = cli(argv)
+    if rc != 0:
+        sys.exit(rc)
 
 
 def main() -> int:
@@ -43,8 +54,8 @@ def main() -> int:
     bind = f"{args.host}:{args.port}"
 
     # 1) Reset any existing dataset quietly (ignore errors), then create fresh
-    subprocess.run([sys.executable, "-m", "server.cli", "create_source", args.name, "--remove"])  # ignore rc
-    run([sys.executable, "-m", "server.cli", "create_source", args.name, "-a", "classic", "-r", "1d"])
+    cli(["create_source", args.name, "--remove"])  # ignore rc
+    run(["create_source", args.name, "-a", "classic", "-r", "1d"])
 
     # 2) Prepare or use source file
     if args.source:
@@ -59,11 +70,11 @@ def main() -> int:
         print(f"Wrote sample source: {sample_path}")
 
     # 3) Compute server-side evaluations and changes.log
-    run([sys.executable, "-m", "server.cli", "sync", args.name, str(sample_path)])
+    run(["sync", args.name, str(sample_path)])
 
     # 4) Start HTTP server (blocks)
     print(f"Starting server on http://{bind} (Ctrl+C to stop)…")
-    run([sys.executable, "-m", "server.cli", "start_server", bind])
+    run(["start_server", bind])
     return 0
 
 
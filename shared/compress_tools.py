@@ -0,0 +1,87 @@
+"""HTTP content-encoding helpers for /sync_data payloads.
+
+gzip (stdlib) is always available; zstd is offered as well when the optional
+``zstandard`` package is installed. Encodings are listed in order of
+preference, and both sides negotiate through ``Accept-Encoding`` /
+``Content-Encoding`` so either end can run without zstd.
+"""
+
+import gzip
+import io
+import zlib
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - optional speedup
+    zstandard = None
+
+
+ENCODINGS: tuple[str, ...] = ("zstd", "gzip") if zstandard is not None else ("gzip",)
+ACCEPT_ENCODING = ", ".join(ENCODINGS)
+
+# Below this size the headers dominate and compression is not worth the CPU
+MIN_SIZE = 1024
+# Above this size the server streams the log with sendfile instead of
+# compressing it per request; it is also the cap on a decoded body
+MAX_SIZE = 4 << 20
+
+
+def negotiate(accept_encoding: str | None) -> str | None:
+    """Return the preferred encoding the client accepts, or None for identity."""
+    if not accept_encoding:
+        return None
+    offered = set()
+    for item in accept_encoding.split(","):
+        name, _, params = item.partition(";")
+        q = params.strip().lower()
+        if q.startswith("q="):
+            try:
+                if float(q[2:]) <= 0:
+                    continue  # explicitly refused
+            except ValueError:
+                pass
+        offered.add(name.strip().lower())
+    for enc in ENCODINGS:
+        if enc in offered:
+            return enc
+    return None
+
+
+def compress(data: bytes, encoding: str) -> bytes:
+    if encoding == "gzip":
+        return gzip.compress(data, compresslevel=6, mtime=0)
+    if encoding == "zstd" and zstandard is not None:
+        return zstandard.ZstdCompressor(level=3).compress(data)
+    raise ValueError(f"Unsupported content encoding: {encoding}")
+
+
+def decompress(data: bytes, encoding: str | None, max_size: int | None = None) -> bytes:
+    """Undo ``Content-Encoding``; identity (None/empty) returns ``data`` as-is.
+
+    With ``max_size`` set, a body that would decode to more than that many
+    bytes raises ValueError instead of being inflated in full.
+    """
+    encoding = (encoding or "identity").strip().lower()
+    if encoding == "identity":
+        return data
+    limit = -1 if max_size is None else max_size + 1
+    if encoding == "gzip":
+        if max_size is None:
+            return gzip.decompress(data)
+        d = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        out = d.decompress(data, limit)
+        if len(out) > max_size or d.unconsumed_tail:
+            raise ValueError(f"Decoded body exceeds {max_size} bytes")
+        if not d.eof or d.unused_data:
+            raise ValueError("Malformed gzip body")
+        return out
+    if encoding == "zstd" and zstandard is not None:
+        with zstandard.ZstdDecompressor().stream_reader(io.BytesIO(data)) as reader:
+            out = reader.read(limit)
+        if max_size is not None and len(out) > max_size:
+            raise ValueError(f"Decoded body exceeds {max_size} bytes")
+        return out
+    raise ValueError(f"Unsupported content encoding: {encoding}")
+
+
+__all__ = ["ENCODINGS", "ACCEPT_ENCODING", "MIN_SIZE", "MAX_SIZE", "negotiate", "compress", "decompress"]
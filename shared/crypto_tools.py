@@ -6,6 +6,9 @@ import platform
 import ctypes
 import ctypes.util
 import hashlib
+import hmac
+import threading
+from functools import lru_cache
 
 
 class MissingLibraryError(RuntimeError):
@@ -29,6 +32,118 @@ _SODIUM_LIB: Optional[ctypes.CDLL] = None
 _SODIUM_PATH: Optional[str] = None
 
 
+def _lazy(name: str, missing: str):
+    """Stand-in for a libsodium binding that loads the library on first call.
+
+    _load_libsodium rebinds the module global, so later calls go straight to
+    ctypes and the helpers need no per-call "is it loaded" check.
+    """
+    def call(*args):
+        _load_libsodium()
+        fn = globals()[name]
+        if fn is None:
+            raise MissingLibraryError(missing)
+        return fn(*args)
+    return call
+
+
+# libsodium functions with their prototypes set once by _load_libsodium, so the
+# helpers below only make the call. The optional ones become None when the
+# loaded libsodium lacks them; the helpers raise MissingLibraryError then.
+_H2G = _lazy("_H2G", "libsodium missing ristretto255 from_hash")
+_SCALARMULT = _lazy("_SCALARMULT", "libsodium missing ristretto255 scalarmult")
+_SCALAR_RANDOM = _lazy("_SCALAR_RANDOM", "libsodium missing ristretto255 scalar_random")
+_SCALAR_INVERT = _lazy("_SCALAR_INVERT", "libsodium missing ristretto255 scalar_invert")
+_AEAD_ENC = _lazy("_AEAD_ENC", "libsodium missing XChaCha20-Poly1305 IETF support")
+_AEAD_DEC = _lazy("_AEAD_DEC", "libsodium missing XChaCha20-Poly1305 IETF support")
+
+
+_TLS = threading.local()
+
+
+def _scratch() -> tuple:
+    """Return this thread's pair of reusable 32-byte libsodium output buffers."""
+    try:
+        return _TLS.bufs
+    except AttributeError:
+        bufs = _TLS.bufs = (ctypes.create_string_buffer(32), ctypes.create_string_buffer(32))
+        return bufs
+
+
+def _as_bytes(value) -> bytes:
+    """Return ``value`` as bytes, skipping the copy when it already is bytes."""
+    return value if type(value) is bytes else bytes(value)
+
+
+def _check_len(name: str, value: bytes, size: int) -> bytes:
+    value = _as_bytes(value)
+    if len(value) != size:
+        raise ValueError(f"{name} must be {size} bytes")
+    return value
+
+
+def _check_32(name: str, value: bytes) -> bytes:
+    return _check_len(name, value, 32)
+
+
+def _optional_fn(lib: ctypes.CDLL, name: str):
+    try:
+        return getattr(lib, name)
+    except AttributeError:
+        return None
+
+
+def _bind_prototypes(lib: ctypes.CDLL) -> None:
+    global _H2G, _SCALARMULT, _SCALAR_RANDOM, _SCALAR_INVERT, _AEAD_ENC, _AEAD_DEC
+    # Buffers are c_char_p throughout: bytes inputs are handed to libsodium in
+    # place (callers check lengths), outputs are create_string_buffer objects.
+    buf = ctypes.c_char_p
+
+    h2g = lib.crypto_core_ristretto255_from_hash
+    h2g.restype = ctypes.c_int
+    h2g.argtypes = [buf, buf]
+    scalarmult = lib.crypto_scalarmult_ristretto255
+    scalarmult.restype = ctypes.c_int
+    scalarmult.argtypes = [buf, buf, buf]
+
+    scalar_random = _optional_fn(lib, "crypto_core_ristretto255_scalar_random")
+    if scalar_random is not None:
+        scalar_random.restype = None
+        scalar_random.argtypes = [buf]
+    scalar_invert = _optional_fn(lib, "crypto_core_ristretto255_scalar_invert")
+    if scalar_invert is not None:
+        scalar_invert.restype = ctypes.c_int
+        scalar_invert.argtypes = [buf, buf]
+
+    aead_enc = _optional_fn(lib, "crypto_aead_xchacha20poly1305_ietf_encrypt")
+    if aead_enc is not None:
+        aead_enc.restype = ctypes.c_int
+        aead_enc.argtypes = [
+            ctypes.c_char_p,
+            ctypes.POINTER(ctypes.c_ulonglong),
+            ctypes.c_char_p, ctypes.c_ulonglong,
+            ctypes.c_char_p, ctypes.c_ulonglong,
+            ctypes.c_void_p,
+            ctypes.c_char_p,
+            ctypes.c_char_p,
+        ]
+    aead_dec = _optional_fn(lib, "crypto_aead_xchacha20poly1305_ietf_decrypt")
+    if aead_dec is not None:
+        aead_dec.restype = ctypes.c_int
+        aead_dec.argtypes = [
+            ctypes.c_char_p, ctypes.POINTER(ctypes.c_ulonglong),
+            ctypes.c_void_p,  # nsec (unused)
+            ctypes.c_char_p, ctypes.c_ulonglong,
+            ctypes.c_char_p, ctypes.c_ulonglong,
+            ctypes.c_char_p,  # nonce
+            ctypes.c_char_p,  # key
+        ]
+
+    _H2G, _SCALARMULT = h2g, scalarmult
+    _SCALAR_RANDOM, _SCALAR_INVERT = scalar_random, scalar_invert
+    _AEAD_ENC, _AEAD_DEC = aead_enc, aead_dec
+
+
 def _load_libsodium() -> ctypes.CDLL:
     """Load libsodium and cache the CDLL handle; raise clear guidance if missing."""
     global _SODIUM_LIB, _SODIUM_PATH
@@ -69,16 +184,7 @@ def _load_libsodium() -> ctypes.CDLL:
             except Exception:
                 pass
 
-            lib.crypto_core_ristretto255_from_hash.argtypes = [
-                ctypes.POINTER(ctypes.c_ubyte),
-                ctypes.POINTER(ctypes.c_ubyte),
-            ]
-            lib.crypto_scalarmult_ristretto255.restype = ctypes.c_int
-            lib.crypto_scalarmult_ristretto255.argtypes = [
-                ctypes.POINTER(ctypes.c_ubyte),
-                ctypes.POINTER(ctypes.c_ubyte),
-                ctypes.POINTER(ctypes.c_ubyte),
-            ]
+            _bind_prototypes(lib)
 
             _SODIUM_LIB = lib
             _SODIUM_PATH = path
@@ -98,6 +204,27 @@ def _load_libsodium() -> ctypes.CDLL:
 # liboprf no longer required; we use libsodium directly
 
 
+@lru_cache(maxsize=64)
+def _domain_tags(data_name: str) -> tuple[bytes, bytes, bytes]:
+    """Return (DST_H2G, DST_FIN, HKDF info) for a dataset, encoded once per name."""
+    return (
+        data_name.encode("utf-8"),
+        f"{data_name}-FINALIZE".encode("utf-8"),
+        ("meta|" + data_name).encode("utf-8"),
+    )
+
+
+@lru_cache(maxsize=64)
+def _primed_sha512(data_name: str) -> tuple:
+    """Return SHA-512 contexts already fed DST_H2G and DST_FIN for a dataset.
+
+    Callers hash with ``ctx.copy()``, which is cheaper than constructing a new
+    hasher and absorbing the tag again on every call.
+    """
+    dst_h2g, dst_fin, _ = _domain_tags(data_name)
+    return hashlib.sha512(dst_h2g), hashlib.sha512(dst_fin)
+
+
 def evaluate_oprf_ristretto255(server_private_key: bytes, input_data: bytes, data_name: str) -> bytes:
     """
     Evaluate the server-side output for OPRF(ristretto255, SHA-512) using
@@ -114,36 +241,7 @@ def evaluate_oprf_ristretto255(server_private_key: bytes, input_data: bytes, dat
 
     Returns: 64 bytes (SHA-512 digest) representing the PRF output.
     """
-    if not isinstance(server_private_key, (bytes, bytearray)) or len(server_private_key) != 32:
-        raise ValueError("server_private_key must be 32 bytes")
-    if not isinstance(input_data, (bytes, bytearray)):
-        raise ValueError("input_data must be bytes-like")
-    if not isinstance(data_name, str) or not data_name:
-        raise ValueError("data_name must be a non-empty string")
-
-    lib = _load_libsodium()
-
-    # 1) Hash-to-group using SHA-512 with domain separation
-    DST_H2G = data_name.encode("utf-8")
-    wide_hash = hashlib.sha512(DST_H2G + bytes(input_data)).digest()  # 64 bytes
-
-    p_out = (ctypes.c_ubyte * 32)()
-    wide_buf = (ctypes.c_ubyte * 64).from_buffer_copy(wide_hash)
-    lib.crypto_core_ristretto255_from_hash(p_out, wide_buf)
-
-    # 2) Scalar multiplication: Q = k * P
-    q_out = (ctypes.c_ubyte * 32)()
-    sk_buf = (ctypes.c_ubyte * 32).from_buffer_copy(bytes(server_private_key))
-    rc = lib.crypto_scalarmult_ristretto255(q_out, sk_buf, p_out)
-    if rc != 0:
-        raise MissingLibraryError("crypto_scalarmult_ristretto255 failed (invalid scalar/point)")
-
-    q_bytes = bytes(q_out)
-
-    # 3) Finalize: hash with domain separation
-    DST_FIN = f"{data_name}-FINALIZE".encode("utf-8")
-    out = hashlib.sha512(DST_FIN + bytes(input_data) + q_bytes).digest()
-    return out
+    return evaluate_oprf_ristretto255_components(server_private_key, input_data, data_name)[0]
 
 
 def evaluate_oprf_ristretto255_components(server_private_key: bytes, input_data: bytes, data_name: str) -> tuple[bytes, bytes]:
@@ -159,24 +257,21 @@ def evaluate_oprf_ristretto255_components(server_private_key: bytes, input_data:
     if not isinstance(data_name, str) or not data_name:
         raise ValueError("data_name must be a non-empty string")
 
-    lib = _load_libsodium()
-
-    DST_H2G = data_name.encode("utf-8")
-    wide_hash = hashlib.sha512(DST_H2G + bytes(input_data)).digest()
-    p_out = (ctypes.c_ubyte * 32)()
-    wide_buf = (ctypes.c_ubyte * 64).from_buffer_copy(wide_hash)
-    lib.crypto_core_ristretto255_from_hash(p_out, wide_buf)
+    p_out, q_out = _scratch()
+    h2g_ctx, fin_ctx = _primed_sha512(data_name)
+    h = h2g_ctx.copy()
+    h.update(input_data)
+    _H2G(p_out, h.digest())
 
-    q_out = (ctypes.c_ubyte * 32)()
-    sk_buf = (ctypes.c_ubyte * 32).from_buffer_copy(bytes(server_private_key))
-    rc = lib.crypto_scalarmult_ristretto255(q_out, sk_buf, p_out)
+    rc = _SCALARMULT(q_out, _as_bytes(server_private_key), p_out)
     if rc != 0:
         raise MissingLibraryError("crypto_scalarmult_ristretto255 failed (invalid scalar/point)")
-    q_bytes = bytes(q_out)
+    q_bytes = q_out.raw
 
-    DST_FIN = f"{data_name}-FINALIZE".encode("utf-8")
-    prf = hashlib.sha512(DST_FIN + bytes(input_data) + q_bytes).digest()
-    return prf, q_bytes
+    h = fin_ctx.copy()
+    h.update(input_data)
+    h.update(q_bytes)
+    return h.digest(), q_bytes
 
 
 # Client/Server OPRF helpers (blinding flow)
@@ -184,64 +279,57 @@ def evaluate_oprf_ristretto255_components(server_private_key: bytes, input_data:
 def ristretto_hash_to_group(data_name: str, input_data: bytes) -> bytes:
     if not isinstance(data_name, str) or not data_name:
         raise ValueError("data_name must be non-empty string")
-    lib = _load_libsodium()
-    wide_hash = hashlib.sha512(data_name.encode("utf-8") + bytes(input_data)).digest()
-    p_out = (ctypes.c_ubyte * 32)()
-    wide_buf = (ctypes.c_ubyte * 64).from_buffer_copy(wide_hash)
-    lib.crypto_core_ristretto255_from_hash(p_out, wide_buf)
-    return bytes(p_out)
+    h = _primed_sha512(data_name)[0].copy()
+    h.update(input_data)
+    p_out = _scratch()[0]
+    _H2G(p_out, h.digest())
+    return p_out.raw
 
 
 def ristretto_scalar_random() -> bytes:
-    lib = _load_libsodium()
-    try:
-        fn = lib.crypto_core_ristretto255_scalar_random
-    except AttributeError:
+    if _SCALAR_RANDOM is None:
         raise MissingLibraryError("libsodium missing ristretto255 scalar_random")
-    buf = (ctypes.c_ubyte * 32)()
-    fn(buf)
-    return bytes(buf)
+    buf = _scratch()[0]
+    _SCALAR_RANDOM(buf)
+    return buf.raw
 
 
 def ristretto_scalar_invert(x: bytes) -> bytes:
-    lib = _load_libsodium()
-    try:
-        fn = lib.crypto_core_ristretto255_scalar_invert
-    except AttributeError:
+    if _SCALAR_INVERT is None:
         raise MissingLibraryError("libsodium missing ristretto255 scalar_invert")
-    out = (ctypes.c_ubyte * 32)()
-    x_buf = (ctypes.c_ubyte * 32).from_buffer_copy(bytes(x))
-    fn(out, x_buf)
-    return bytes(out)
+    out = _scratch()[0]
+    _SCALAR_INVERT(out, _check_32("scalar", x))
+    return out.raw
 
 
 def ristretto_scalarmult(scalar: bytes, point: bytes) -> bytes:
-    lib = _load_libsodium()
-    out = (ctypes.c_ubyte * 32)()
-    s_buf = (ctypes.c_ubyte * 32).from_buffer_copy(bytes(scalar))
-    p_buf = (ctypes.c_ubyte * 32).from_buffer_copy(bytes(point))
-    rc = lib.crypto_scalarmult_ristretto255(out, s_buf, p_buf)
+    out = _scratch()[0]
+    rc = _SCALARMULT(out, _check_32("scalar", scalar), _check_32("point", point))
     if rc != 0:
         raise MissingLibraryError("crypto_scalarmult_ristretto255 failed")
-    return bytes(out)
+    return out.raw
 
 
 def oprf_finalize(data_name: str, input_data: bytes, q_point: bytes) -> bytes:
-    DST_FIN = f"{data_name}-FINALIZE".encode("utf-8")
-    return hashlib.sha512(DST_FIN + bytes(input_data) + bytes(q_point)).digest()
+    h = _primed_sha512(data_name)[1].copy()
+    h.update(input_data)
+    h.update(q_point)
+    return h.digest()
 
 
 def _hkdf_sha512(ikm: bytes, info: bytes, length: int, salt: bytes | None = None) -> bytes:
-    import hmac
-
     if salt is None:
         salt = b"\x00" * 64
-    prk = hmac.new(salt, ikm, hashlib.sha512).digest()
+    # hmac.digest is the one-shot C path; no HMAC object per block
+    prk = hmac.digest(salt, ikm, "sha512")
+    if length <= 64:
+        # A single expand block T(1) covers it (all callers want 32-byte keys)
+        return hmac.digest(prk, info + b"\x01", "sha512")[:length]
     okm = b""
     t = b""
     counter = 1
     while len(okm) < length:
-        t = hmac.new(prk, t + info + bytes([counter]), hashlib.sha512).digest()
+        t = hmac.digest(prk, t + info + bytes((counter,)), "sha512")
         okm += t
         counter += 1
     return okm[:length]
@@ -251,82 +339,50 @@ def _sodium_xchacha20poly1305_encrypt(key: bytes, nonce: bytes, plaintext: bytes
     """Encrypt using libsodium crypto_aead_xchacha20poly1305_ietf_encrypt.
 
     Returns ciphertext (includes MAC tag; no prefix)."""
-    lib = _load_libsodium()
-
-    # Prototype setup
-    try:
-        fn = lib.crypto_aead_xchacha20poly1305_ietf_encrypt
-    except AttributeError as e:
+    if _AEAD_ENC is None:
         raise MissingLibraryError("libsodium missing XChaCha20-Poly1305 IETF support")
-    fn.restype = ctypes.c_int
-    fn.argtypes = [
-        ctypes.POINTER(ctypes.c_ubyte),
-        ctypes.POINTER(ctypes.c_ulonglong),
-        ctypes.POINTER(ctypes.c_ubyte), ctypes.c_ulonglong,
-        ctypes.POINTER(ctypes.c_ubyte), ctypes.c_ulonglong,
-        ctypes.c_void_p,
-        ctypes.POINTER(ctypes.c_ubyte),
-        ctypes.POINTER(ctypes.c_ubyte),
-    ]
-
-    m = bytes(plaintext)
-    ad = bytes(aad) if aad else None
-    c_buf = (ctypes.c_ubyte * (len(m) + 16))()
-    c_len = ctypes.c_ulonglong()
-    m_buf = (ctypes.c_ubyte * len(m)).from_buffer_copy(m) if m else (ctypes.c_ubyte * 0)()
-    ad_buf = (ctypes.c_ubyte * len(ad)).from_buffer_copy(ad) if ad else None
-    n_buf = (ctypes.c_ubyte * 24).from_buffer_copy(nonce)
-    k_buf = (ctypes.c_ubyte * 32).from_buffer_copy(key)
+    # libsodium reads exactly 24/32 bytes from these; never hand it less
+    nonce = _check_len("nonce", nonce, 24)
+    key = _check_len("key", key, 32)
 
-    ad_ptr = ctypes.cast(ad_buf, ctypes.POINTER(ctypes.c_ubyte)) if ad else None
+    m = _as_bytes(plaintext)
+    ad = _as_bytes(aad) if aad else None
+    c_buf = ctypes.create_string_buffer(len(m) + 16)
+    c_len = ctypes.c_ulonglong()
 
-    rc = fn(
+    rc = _AEAD_ENC(
         c_buf,
         ctypes.byref(c_len),
-        m_buf, ctypes.c_ulonglong(len(m)),
-        ad_ptr, ctypes.c_ulonglong(len(ad) if ad else 0),
+        m, len(m),
+        ad, len(ad) if ad else 0,
         None,
-        n_buf,
-        k_buf,
+        nonce,
+        key,
     )
     if rc != 0:
         raise MissingLibraryError("XChaCha20-Poly1305 encryption failed")
-    return bytes(c_buf)[: c_len.value]
+    return c_buf.raw[: c_len.value]
 
 
 def _sodium_xchacha20poly1305_decrypt(key: bytes, nonce: bytes, ciphertext: bytes, aad: bytes | None = None) -> bytes:
-    lib = _load_libsodium()
-    try:
-        fn = lib.crypto_aead_xchacha20poly1305_ietf_decrypt
-    except AttributeError:
+    if _AEAD_DEC is None:
         raise MissingLibraryError("libsodium missing XChaCha20-Poly1305 IETF support")
-    fn.restype = ctypes.c_int
-    fn.argtypes = [
-        ctypes.POINTER(ctypes.c_ubyte), ctypes.POINTER(ctypes.c_ulonglong),
-        ctypes.c_void_p,  # nsec (unused)
-        ctypes.POINTER(ctypes.c_ubyte), ctypes.c_ulonglong,
-        ctypes.POINTER(ctypes.c_ubyte), ctypes.c_ulonglong,
-        ctypes.POINTER(ctypes.c_ubyte),  # nonce
-        ctypes.POINTER(ctypes.c_ubyte),  # key
-    ]
-    c = bytes(ciphertext)
-    ad = bytes(aad) if aad else None
-    m_buf = (ctypes.c_ubyte * (len(c) - 16))()
+    nonce = _check_len("nonce", nonce, 24)
+    key = _check_len("key", key, 32)
+    c = _as_bytes(ciphertext)
+    ad = _as_bytes(aad) if aad else None
+    # libsodium rejects ciphertexts shorter than the tag itself
+    m_buf = ctypes.create_string_buffer(max(len(c) - 16, 0))
     m_len = ctypes.c_ulonglong()
-    c_buf = (ctypes.c_ubyte * len(c)).from_buffer_copy(c)
-    ad_buf = (ctypes.c_ubyte * len(ad)).from_buffer_copy(ad) if ad else None
-    n_buf = (ctypes.c_ubyte * 24).from_buffer_copy(nonce)
-    k_buf = (ctypes.c_ubyte * 32).from_buffer_copy(key)
-    ad_ptr = ctypes.cast(ad_buf, ctypes.POINTER(ctypes.c_ubyte)) if ad else None
-    rc = fn(
+    rc = _AEAD_DEC(
         m_buf, ctypes.byref(m_len), None,
-        c_buf, ctypes.c_ulonglong(len(c)),
-        ad_ptr, ctypes.c_ulonglong(len(ad) if ad else 0),
-        n_buf, k_buf,
+        c, len(c),
+        ad, len(ad) if ad else 0,
+        nonce, key,
     )
     if rc != 0:
         raise MissingLibraryError("XChaCha20-Poly1305 decryption failed")
-    return bytes(m_buf)[: m_len.value]
+    return m_buf.raw[: m_len.value]
 
 
 def evaluate_and_encrypt_metadata(server_private_key: bytes, ioc: bytes, data_name: str, metadata: bytes) -> tuple[bytes, bytes, bytes]:
@@ -342,19 +398,142 @@ def evaluate_and_encrypt_metadata(server_private_key: bytes, ioc: bytes, data_na
     """
     prf, q_bytes = evaluate_oprf_ristretto255_components(server_private_key, ioc, data_name)
     ikm = prf + q_bytes
-    info = ("meta|" + data_name).encode("utf-8")
+    info = _domain_tags(data_name)[2]
     key = _hkdf_sha512(ikm, info, 32)
     nonce = os.urandom(24)
     ct = _sodium_xchacha20poly1305_encrypt(key, nonce, metadata, aad=ioc)
     return prf, nonce, ct
 
 
+def _evaluate_and_encrypt_chunk(
+    sk: bytes, data_name: str, iocs, metadatas, dedup: bool = False
+) -> list[tuple[bytes, bytes, bytes]]:
+    from_hash, scalarmult, encrypt = _H2G, _SCALARMULT, _AEAD_ENC
+    h2g_ctx, fin_ctx = _primed_sha512(data_name)
+    info = _domain_tags(data_name)[2]
+    # HKDF-SHA512 with a zero salt and a single output block (32 <= 64 bytes)
+    salt = b"\x00" * 64
+    info_block = info + b"\x01"
+    p_out, q_out = _scratch()
+    c_len = ctypes.c_ulonglong()
+    # The OPRF half is deterministic, so repeated IOCs reuse (prf, Q); each one
+    # still gets its own nonce and ciphertext below.
+    memo: Optional[dict] = {} if dedup else None
+    # One getrandom() call for the whole chunk instead of one per IOC
+    nonces = os.urandom(24 * len(iocs))
+    offset = 0
+
+    results = []
+    for ioc, metadata in zip(iocs, metadatas):
+        # Inline form of _as_bytes; this loop runs once per IOC
+        if type(ioc) is not bytes:
+            ioc = bytes(ioc)
+        m = metadata if type(metadata) is bytes else bytes(metadata)
+        known = memo.get(ioc) if memo is not None else None
+        if known is None:
+            h = h2g_ctx.copy()
+            h.update(ioc)
+            from_hash(p_out, h.digest())
+            if scalarmult(q_out, sk, p_out) != 0:
+                raise MissingLibraryError("crypto_scalarmult_ristretto255 failed (invalid scalar/point)")
+            q_bytes = q_out.raw
+            h = fin_ctx.copy()
+            h.update(ioc)
+            h.update(q_bytes)
+            prf = h.digest()
+            if memo is not None:
+                memo[ioc] = (prf, q_bytes)
+        else:
+            prf, q_bytes = known
+        prk = hmac.digest(salt, prf + q_bytes, "sha512")
+        key = hmac.digest(prk, info_block, "sha512")[:32]
+        nonce = nonces[offset:offset + 24]
+        offset += 24
+        c_buf = ctypes.create_string_buffer(len(m) + 16)
+        rc = encrypt(c_buf, ctypes.byref(c_len), m, len(m), ioc, len(ioc), None, nonce, key)
+        if rc != 0:
+            raise MissingLibraryError("XChaCha20-Poly1305 encryption failed")
+        results.append((prf, nonce, c_buf.raw[:c_len.value]))
+    return results
+
+
+# Batches at least this large are split across threads; libsodium calls run
+# without the GIL, so the scalar multiplications proceed in parallel.
+_BATCH_PARALLEL_MIN = 512
+
+
+def evaluate_and_encrypt_metadata_batch(
+    server_private_key: bytes,
+    iocs: list[bytes],
+    data_name: str,
+    metadatas: list[bytes],
+    max_workers: Optional[int] = None,
+) -> list[tuple[bytes, bytes, bytes]]:
+    """Batch form of evaluate_and_encrypt_metadata; returns (prf, nonce, ciphertext) per IOC.
+
+    Output is interchangeable with the single-IOC call. Validation and HKDF
+    constants are set up once per batch and inputs are passed to libsodium
+    without intermediate ctypes copies. The cost is dominated by the scalar
+    multiplication, so an IOC repeated within a batch is evaluated once, and
+    large batches are spread over ``max_workers`` threads (default:
+    ``SODIUM_WORKERS``, else one per CPU).
+    """
+    if not isinstance(server_private_key, (bytes, bytearray)) or len(server_private_key) != 32:
+        raise ValueError("server_private_key must be 32 bytes")
+    if not isinstance(data_name, str) or not data_name:
+        raise ValueError("data_name must be a non-empty string")
+    if len(iocs) != len(metadatas):
+        raise ValueError("iocs and metadatas must have the same length")
+
+    _load_libsodium()
+    if _AEAD_ENC is None:
+        raise MissingLibraryError("libsodium missing XChaCha20-Poly1305 IETF support")
+    sk = _as_bytes(server_private_key)
+    # Only keep a memo when the batch actually repeats an IOC
+    dedup = len(set(map(_as_bytes, iocs))) < len(iocs)
+    return _map_chunks(
+        lambda ioc_chunk, meta_chunk: _evaluate_and_encrypt_chunk(sk, data_name, ioc_chunk, meta_chunk, dedup),
+        iocs, metadatas, max_workers=max_workers,
+    )
+
+
+def _default_workers() -> int:
+    try:
+        workers = int(os.getenv("SODIUM_WORKERS", ""))
+    except ValueError:
+        workers = 0
+    return workers if workers > 0 else (os.cpu_count() or 1)
+
+
+def _map_chunks(fn, *seqs, max_workers: Optional[int] = None) -> list:
+    """Apply fn to parallel sequences and concatenate its list results in order.
+
+    Sequences of at least _BATCH_PARALLEL_MIN items are cut into one slice per
+    worker thread (default: SODIUM_WORKERS, else one per CPU); smaller ones run
+    on the caller.
+    """
+    n = len(seqs[0])
+    workers = max_workers or _default_workers()
+    if workers <= 1 or n < _BATCH_PARALLEL_MIN:
+        return fn(*seqs)
+
+    from concurrent.futures import ThreadPoolExecutor
+
+    step = -(-n // workers)
+    with ThreadPoolExecutor(max_workers=workers) as ex:
+        futures = [ex.submit(fn, *(seq[i:i + step] for seq in seqs)) for i in range(0, n, step)]
+        results = []
+        for fut in futures:
+            results.extend(fut.result())
+    return results
+
+
 def decrypt_metadata_from_prf_and_q(data_name: str, ioc: bytes, prf: bytes, q_point: bytes, nonce: bytes, ct: bytes) -> bytes:
     """Derive key via HKDF(PRF||Q) and decrypt metadata (XChaCha20-Poly1305, AAD=ioc).
     Returns plaintext bytes.
     """
     ikm = prf + q_point
-    info = ("meta|" + data_name).encode("utf-8")
+    info = _domain_tags(data_name)[2]
     key = _hkdf_sha512(ikm, info, 32)
     return _sodium_xchacha20poly1305_decrypt(key, nonce, ct, aad=ioc)
 
@@ -364,6 +543,31 @@ def evaluate_blinded_point(server_private_key: bytes, blinded_point: bytes) -> b
     return ristretto_scalarmult(server_private_key, blinded_point)
 
 
+def _evaluate_blinded_chunk(sk: bytes, points) -> list[bytes]:
+    out = _scratch()[0]
+    scalarmult = _SCALARMULT
+    results = []
+    for point in points:
+        if scalarmult(out, sk, point) != 0:
+            raise MissingLibraryError("crypto_scalarmult_ristretto255 failed")
+        results.append(out.raw)
+    return results
+
+
+def evaluate_blinded_points_batch(
+    server_private_key: bytes, blinded_points: list[bytes], max_workers: Optional[int] = None
+) -> list[bytes]:
+    """Batch form of evaluate_blinded_point; returns k * B for each blinded point.
+
+    Inputs are validated once up front and large batches are spread over
+    threads like evaluate_and_encrypt_metadata_batch.
+    """
+    sk = _check_32("server_private_key", server_private_key)
+    points = [_check_32("point", b) for b in blinded_points]
+    _load_libsodium()
+    return _map_chunks(lambda chunk: _evaluate_blinded_chunk(sk, chunk), points, max_workers=max_workers)
+
+
 def _fmt_loaded(path: Optional[str]) -> str:
     if path:
         return f"Preloaded libsodium from: {path}. "
@@ -0,0 +1,36 @@
+"""JSON (de)serialization that uses orjson when installed and stdlib json otherwise.
+
+Both backends produce compact UTF-8 ``bytes`` from ``dumps`` (two-space
+indented from ``dumps_indented``, for files people read) and accept ``bytes``
+or ``str`` in ``loads``. Decode errors are ``json.JSONDecodeError``
+in either case (orjson's error type subclasses it).
+"""
+
+import json
+from json import JSONDecodeError
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speedup
+    orjson = None
+
+
+if orjson is not None:
+    dumps = orjson.dumps
+    loads = orjson.loads
+
+    def dumps_indented(obj) -> bytes:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2)
+else:  # pragma: no cover - exercised when orjson is absent
+
+    def dumps(obj) -> bytes:
+        return json.dumps(obj, separators=(",", ":")).encode("utf-8")
+
+    def dumps_indented(obj) -> bytes:
+        return json.dumps(obj, indent=2).encode("utf-8")
+
+    def loads(data: bytes | str):
+        return json.loads(data)
+
+
+__all__ = ["dumps", "dumps_indented", "loads", "JSONDecodeError"]
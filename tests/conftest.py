@@ -1,31 +1,84 @@
 import os
 import shutil
-import socket
 import subprocess
 import sys
 from pathlib import Path
 
 import pytest
 
+from . import utils
+from .utils import pick_free_port, wait_for_port
 
-def _copy_workspace(src_root: Path, dst_root: Path) -> None:
+
+def pytest_addoption(parser: pytest.Parser) -> None:
+    parser.addoption(
+        "--subprocess-cli",
+        action="store_true",
+        help="run server.cli/client.cli in a subprocess per call instead of in-process",
+    )
+
+
+def pytest_configure(config: pytest.Config) -> None:
+    if config.getoption("--subprocess-cli"):
+        utils.IN_PROCESS_CLI = False
+    # Keep workspaces in RAM where tmpfs is available; set PYTEST_DEBUG_TEMPROOT
+    # (or pass --basetemp) to put them elsewhere.
+    if sys.platform.startswith("linux") and os.access("/dev/shm", os.W_OK):
+        os.environ.setdefault("PYTEST_DEBUG_TEMPROOT", "/dev/shm")
+
+
+# Runtime state the CLIs write, some of it in place (changes.log appends,
+# active_index.delta, matches.txt). Never copied, so every workspace starts
+# empty and no such file is shared by inode between workspaces.
+_STATE_DIRS = {"server": {"data", "secrets"}, "client": {"data"}}
+
+
+def _copy_workspace(src_root: Path, dst_root: Path, copy_function=shutil.copy2) -> None:
     for name in ("server", "client", "shared"):
-        shutil.copytree(src_root / name, dst_root / name)
+        top = str(src_root / name)
+        skip = _STATE_DIRS.get(name, set())
+
+        def ignore(path: str, names: list[str], top=top, skip=skip) -> set[str]:
+            return skip.intersection(names) if path == top else set()
+
+        shutil.copytree(src_root / name, dst_root / name, copy_function=copy_function, ignore=ignore)
+
+
+def _link_or_copy(src: str, dst: str) -> None:
+    try:
+        os.link(src, dst)
+    except OSError:  # EXDEV, or a filesystem without hardlinks
+        shutil.copy2(src, dst)
+
+
+_SRC_ROOT = Path(__file__).resolve().parents[1]
+
+
+@pytest.fixture(scope="session")
+def workspace_template(tmp_path_factory: pytest.TempPathFactory) -> Path:
+    """Pristine copy of the code trees that each test's workspace hardlinks.
+
+    Only code is linked: the template leaves out the data and secrets
+    directories, whose files the CLIs append to or rewrite in place. Sources
+    are never written by the tests, and Python's .pyc writer replaces files
+    atomically.
+    """
+    dst = tmp_path_factory.mktemp("template")
+    _copy_workspace(_SRC_ROOT, dst)
+    return dst
 
 
 @pytest.fixture()
-def workspace(tmp_path: Path) -> Path:
-    src_root = Path(__file__).resolve().parents[1]
+def workspace(tmp_path: Path, workspace_template: Path) -> Path:
     dst = tmp_path / "ws"
-    _copy_workspace(src_root, dst)
+    _copy_workspace(workspace_template, dst, _link_or_copy)
     return dst
 
 
-@pytest.fixture()
-def pyexe(workspace: Path) -> str:
+def _find_python(base: Path) -> str:
     candidates = [
-        workspace.parents[1] / ".venv312" / "bin" / "python",
-        workspace.parents[1] / ".venv312" / "bin" / "python3",
+        base / ".venv312" / "bin" / "python",
+        base / ".venv312" / "bin" / "python3",
         Path(sys.executable),
     ]
     for p in candidates:
@@ -34,39 +87,47 @@ def pyexe(workspace: Path) -> str:
     return sys.executable
 
 
-def run_module(py: str, mod: str, args: list[str], cwd: Path) -> subprocess.CompletedProcess:
-    env = os.environ.copy()
-    env["PYTHONPATH"] = str(cwd)
-    cmd = [py, "-m", mod, *args]
-    return subprocess.run(cmd, cwd=cwd, capture_output=True, text=True, env=env)
+@pytest.fixture()
+def pyexe(workspace: Path) -> str:
+    return _find_python(workspace.parents[1])
 
 
-@pytest.fixture()
-def libsodium_available(workspace: Path, pyexe: str) -> bool:
-    code = "from shared.crypto_tools import _load_libsodium; _load_libsodium(); print('OK')"
-    env = os.environ.copy()
-    env["PYTHONPATH"] = str(workspace)
-    cp = subprocess.run([pyexe, "-c", code], cwd=workspace, capture_output=True, text=True, env=env)
-    return cp.returncode == 0 and "OK" in cp.stdout
+@pytest.fixture(scope="session")
+def server_workspace(tmp_path_factory: pytest.TempPathFactory, workspace_template: Path) -> Path:
+    """Workspace shared by every test that talks to ``running_server``.
 
+    Tests using it must pick their own dataset names so they don't collide.
+    """
+    dst = tmp_path_factory.mktemp("server") / "ws"
+    _copy_workspace(workspace_template, dst, _link_or_copy)
+    return dst
 
-def wait_for_port(host: str, port: int, timeout: float = 5.0) -> None:
-    import time
 
-    deadline = time.time() + timeout
-    while time.time() < deadline:
-        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-            s.settimeout(0.25)
-            try:
-                s.connect((host, port))
-                return
-            except OSError:
-                time.sleep(0.05)
-    raise RuntimeError(f"Server {host}:{port} not reachable within {timeout}s")
+@pytest.fixture(scope="session")
+def server_pyexe(server_workspace: Path) -> str:
+    return _find_python(server_workspace.parents[1])
 
 
-def pick_free_port() -> int:
-    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
-        s.bind(("127.0.0.1", 0))
-        return s.getsockname()[1]
+@pytest.fixture(scope="session")
+def running_server(server_workspace: Path, server_pyexe: str):
+    """Start one ``server.cli start_server`` for the session; yields (host, port, bind)."""
+    host = "127.0.0.1"
+    port = pick_free_port()
+    bind = f"{host}:{port}"
+    env = os.environ.copy()
+    env["PYTHONPATH"] = str(server_workspace)
+    proc = subprocess.Popen([server_pyexe, "-m", "server.cli", "start_server", bind], cwd=server_workspace, env=env)
+    try:
+        wait_for_port(host, port, timeout=5)
+        yield host, port, bind
+    finally:
+        # The server holds no state worth a graceful shutdown
+        proc.kill()
+        proc.wait()
 
+
+def run_module(py: str, mod: str, args: list[str], cwd: Path) -> subprocess.CompletedProcess:
+    env = os.environ.copy()
+    env["PYTHONPATH"] = str(cwd)
+    cmd = [py, "-m", mod, *args]
+    return subprocess.run(cmd, cwd=cwd, capture_output=True, text=True, env=env)
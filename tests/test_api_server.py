@@ -2,18 +2,16 @@ import json
 import time
 from pathlib import Path
 from urllib.request import urlopen, Request
-import subprocess
-import os
 
 import pytest
 
-from .utils import run_module, wait_for_port, pick_free_port
+from .utils import has_libsodium, run_module
+
+pytestmark = pytest.mark.skipif(not has_libsodium(), reason="libsodium not available")
 
 
 def write_source(path: Path, lines: list[tuple[str, str]]):
-    with open(path, "w", encoding="utf-8") as f:
-        for ioc, meta in lines:
-            f.write(f"{ioc},{meta}\n")
+    path.write_text("".join(f"{ioc},{meta}\n" for ioc, meta in lines), encoding="utf-8")
 
 
 def _get(url: str) -> tuple[int, dict, bytes]:
@@ -23,9 +21,9 @@ def _get(url: str) -> tuple[int, dict, bytes]:
         return resp.status, dict(resp.headers), data
 
 
-def test_api_endpoints_full_and_delta(workspace: Path, pyexe: str, libsodium_available: bool):
-    if not libsodium_available:
-        pytest.skip("libsodium not available")
+def test_api_endpoints_full_and_delta(server_workspace: Path, server_pyexe: str, running_server):
+    workspace, pyexe = server_workspace, server_pyexe
+    _, port, _ = running_server
     ds = "HTTP1"
     # Prepare dataset
     r = run_module(pyexe, "server.cli", ["create_source", ds], workspace)
@@ -35,36 +33,117 @@ def test_api_endpoints_full_and_delta(workspace: Path, pyexe: str, libsodium_ava
     r2 = run_module(pyexe, "server.cli", ["sync", ds, str(src)], workspace)
     assert r2.returncode == 0, r2.stderr
 
-    # Start server
-    port = pick_free_port()
-    bind = f"127.0.0.1:{port}"
-    env = os.environ.copy()
-    env["PYTHONPATH"] = str(workspace)
-    proc = subprocess.Popen([pyexe, "-m", "server.cli", "start_server", bind], cwd=workspace, env=env)
-    try:
-        wait_for_port("127.0.0.1", port, timeout=5)
-        # encryption_type
-        st, _, body = _get(f"http://127.0.0.1:{port}/encryption_type?data_type={ds}")
-        assert st == 200
-        info = json.loads(body.decode())
-        assert info["encryption"] == "xchacha20poly1305-ietf"
-        assert info["suite"] == "oprf-ristretto255-sha512"
-
-        # sync_data full
-        st, hdrs, text = _get(f"http://127.0.0.1:{port}/sync_data?data_type={ds}")
-        assert st == 200
-        assert hdrs.get("X-Delta", "full").lower() == "full"
-        lines = text.decode().splitlines()
-        assert lines and lines[0].startswith("ADDED ")
-        last_hash = lines[-1].split()[-1]
-
-        # sync_data delta from last hash
-        st, hdrs, text2 = _get(f"http://127.0.0.1:{port}/sync_data?data_type={ds}&hash={last_hash}")
-        assert st == 200
-        assert hdrs.get("X-Delta", "").lower() == "delta"
-    finally:
-        proc.terminate()
-        try:
-            proc.wait(timeout=2)
-        except Exception:
-            proc.kill()
+    # encryption_type
+    st, _, body = _get(f"http://127.0.0.1:{port}/encryption_type?data_type={ds}")
+    assert st == 200
+    info = json.loads(body.decode())
+    assert info["encryption"] == "xchacha20poly1305-ietf"
+    assert info["suite"] == "oprf-ristretto255-sha512"
+
+    # sync_data full
+    st, hdrs, text = _get(f"http://127.0.0.1:{port}/sync_data?data_type={ds}")
+    assert st == 200
+    assert hdrs.get("X-Delta", "full").lower() == "full"
+    lines = text.decode().splitlines()
+    assert lines and lines[0].startswith("ADDED ")
+    last_hash = lines[-1].split()[-1]
+
+    # sync_data delta from last hash
+    st, hdrs, text2 = _get(f"http://127.0.0.1:{port}/sync_data?data_type={ds}&hash={last_hash}")
+    assert st == 200
+    assert hdrs.get("X-Delta", "").lower() == "delta"
+
+
+def test_sync_data_delta_tracks_appends_and_rekey(server_workspace: Path, server_pyexe: str, running_server):
+    workspace, pyexe = server_workspace, server_pyexe
+    _, port, _ = running_server
+    ds = "HTTP2"
+    r = run_module(pyexe, "server.cli", ["create_source", ds], workspace)
+    assert r.returncode == 0, r.stderr
+    src = workspace / "http_src2.txt"
+    write_source(src, [("ioc1","{\"a\":1}")])
+    r2 = run_module(pyexe, "server.cli", ["sync", ds, str(src)], workspace)
+    assert r2.returncode == 0, r2.stderr
+
+    base = f"http://127.0.0.1:{port}/sync_data?data_type={ds}"
+    st, _, text = _get(base)
+    assert st == 200
+    first_hash = text.decode().splitlines()[-1].split()[-1]
+
+    # Server-side sync appends to changes.log while the server is running
+    write_source(src, [("ioc1","{\"a\":1}"), ("ioc2","{\"b\":2}")])
+    r3 = run_module(pyexe, "server.cli", ["sync", ds, str(src)], workspace)
+    assert r3.returncode == 0, r3.stderr
+    st, hdrs, text = _get(f"{base}&hash={first_hash}")
+    assert hdrs.get("X-Delta", "").lower() == "delta"
+    delta = text.decode().splitlines()
+    assert len(delta) == 1 and delta[0].startswith("ADDED ")
+    tip = delta[0].split()[-1]
+    st, _, body = _get(f"http://127.0.0.1:{port}/latest_hash?data_type={ds}")
+    assert st == 200
+    assert json.loads(body.decode())["hash"] == tip
+    st, hdrs, text = _get(f"{base}&hash={tip}")
+    assert hdrs.get("X-Delta", "").lower() == "delta"
+    assert text == b""
+
+    # Rekey rewrites the log; old hashes no longer match
+    r4 = run_module(pyexe, "server.cli", ["rekey", ds, str(src)], workspace)
+    assert r4.returncode == 0, r4.stderr
+    st, hdrs, text = _get(f"{base}&hash={tip}")
+    assert hdrs.get("X-Delta", "full").lower() == "full"
+    assert len(text.decode().splitlines()) == 2
+
+
+def test_sync_data_gzip_when_accepted(server_workspace: Path, server_pyexe: str, running_server):
+    import gzip
+
+    workspace, pyexe = server_workspace, server_pyexe
+    _, port, bind = running_server
+    ds = "HTTP3"
+    r = run_module(pyexe, "server.cli", ["create_source", ds], workspace)
+    assert r.returncode == 0, r.stderr
+    src = workspace / "http_src3.txt"
+    write_source(src, [(f"ioc{i}", f"{{\"n\":{i}}}") for i in range(10)])
+    r2 = run_module(pyexe, "server.cli", ["sync", ds, str(src)], workspace)
+    assert r2.returncode == 0, r2.stderr
+
+    url = f"http://127.0.0.1:{port}/sync_data?data_type={ds}"
+    st, hdrs, plain = _get(url)
+    assert st == 200 and "Content-Encoding" not in hdrs
+    req = Request(url, headers={"Accept-Encoding": "gzip"})
+    with urlopen(req) as resp:
+        assert resp.headers.get("Content-Encoding") == "gzip"
+        packed = resp.read()
+    assert len(packed) < len(plain)
+    assert gzip.decompress(packed) == plain
+
+    # The client negotiates and stores the decoded log
+    r3 = run_module(pyexe, "client.cli", ["sync_data", bind, ds], workspace)
+    assert r3.returncode == 0, r3.stderr
+    log = workspace / "client" / "data" / f"127.0.0.1_{port}" / ds / "changes.log"
+    assert log.read_bytes() == plain
+
+
+def test_sync_data_omits_partially_written_line(server_workspace: Path, server_pyexe: str, running_server):
+    workspace, pyexe = server_workspace, server_pyexe
+    _, port, _ = running_server
+    ds = "HTTP4"
+    r = run_module(pyexe, "server.cli", ["create_source", ds], workspace)
+    assert r.returncode == 0, r.stderr
+    src = workspace / "http_src4.txt"
+    write_source(src, [("ioc1","{\"a\":1}")])
+    r2 = run_module(pyexe, "server.cli", ["sync", ds, str(src)], workspace)
+    assert r2.returncode == 0, r2.stderr
+
+    # A concurrent sync has written only part of its next line
+    log = workspace / "server" / "data" / ds / "changes.log"
+    complete = log.read_bytes()
+    with open(log, "ab") as f:
+        f.write(b"ADDED " + b"ab" * 64 + b" 00:11 deadbe")
+    base = f"http://127.0.0.1:{port}/sync_data?data_type={ds}"
+    st, hdrs, text = _get(base)
+    assert st == 200 and text == complete
+    assert hdrs.get("Content-Length") == str(len(complete))
+    tip = complete.decode().split()[-1]
+    st, _, text = _get(f"{base}&hash={tip}")
+    assert st == 200 and text == b""
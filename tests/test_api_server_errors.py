@@ -1,13 +1,9 @@
 import json
-import os
-import subprocess
 from urllib.request import Request, urlopen
 from urllib.error import HTTPError
 
 import pytest
 
-from .utils import run_module, wait_for_port, pick_free_port
-
 
 def _get(url: str, accept: str = "application/json"):
     req = Request(url, headers={"Accept": accept})
@@ -28,26 +24,61 @@ def _post_json(url: str, payload: dict):
         return e.code, dict(e.headers or {}), e.read() if hasattr(e, 'read') else b""
 
 
-def test_api_errors_without_dataset(workspace, pyexe):
-    port = pick_free_port()
-    bind = f"127.0.0.1:{port}"
-    env = os.environ.copy()
-    env["PYTHONPATH"] = str(workspace)
-    proc = subprocess.Popen([pyexe, "-m", "server.cli", "start_server", bind], cwd=workspace, env=env)
+def test_api_errors_without_dataset(running_server):
+    _, port, _ = running_server
+    # Unknown data_type for encryption_type
+    st, _, body = _get(f"http://127.0.0.1:{port}/encryption_type?data_type=Nope")
+    assert st == 404
+    # Unknown data_type for sync
+    st, _, body = _get(f"http://127.0.0.1:{port}/sync_data?data_type=Nope", accept="text/plain")
+    assert st == 404
+    # Bad blinded payload
+    st, _, body = _post_json(f"http://127.0.0.1:{port}/oprf_evaluate", {"data_type": "Nope", "blinded": "zz"})
+    assert st == 400 or st == 404
+
+
+def test_unread_post_body_does_not_leak_into_next_request(running_server):
+    import http.client
+
+    host, port, _ = running_server
+    conn = http.client.HTTPConnection(host, port, timeout=5)
+    try:
+        # The 404 is sent without reading the body, so the server must not
+        # parse that body as a follow-up request on the same connection
+        body = b"GET /encryption_type?data_type=Nope HTTP/1.1\r\nHost: x\r\n\r\n"
+        conn.request("POST", "/no_such_path", body=body)
+        resp = conn.getresponse()
+        assert resp.status == 404
+        assert resp.getheader("Connection", "").lower() == "close"
+        resp.read()
+
+        conn.request("POST", "/oprf_evaluate", body=b"[1, 2]", headers={"Content-Type": "application/json"})
+        resp = conn.getresponse()
+        assert resp.status == 400
+        resp.read()
+        # Fully read bodies keep the connection usable
+        conn.request("GET", "/encryption_type?data_type=Nope")
+        resp = conn.getresponse()
+        assert resp.status == 404
+        resp.read()
+    finally:
+        conn.close()
+
+
+def test_oversized_oprf_body_is_refused_before_reading(running_server):
+    import http.client
+
+    host, port, _ = running_server
+    conn = http.client.HTTPConnection(host, port, timeout=5)
     try:
-        wait_for_port("127.0.0.1", port)
-        # Unknown data_type for encryption_type
-        st, _, body = _get(f"http://127.0.0.1:{port}/encryption_type?data_type=Nope")
-        assert st == 404
-        # Unknown data_type for sync
-        st, _, body = _get(f"http://127.0.0.1:{port}/sync_data?data_type=Nope", accept="text/plain")
-        assert st == 404
-        # Bad blinded payload
-        st, _, body = _post_json(f"http://127.0.0.1:{port}/oprf_evaluate", {"data_type": "Nope", "blinded": "zz"})
-        assert st == 400 or st == 404
+        # Only the headers are sent; a server that read the body would stall
+        conn.putrequest("POST", "/oprf_evaluate")
+        conn.putheader("Content-Type", "application/json")
+        conn.putheader("Content-Length", str(10 << 20))
+        conn.endheaders()
+        resp = conn.getresponse()
+        assert resp.status == 413
+        assert resp.getheader("Connection", "").lower() == "close"
+        assert "too large" in json.loads(resp.read())["error"]
     finally:
-        proc.terminate()
-        try:
-            proc.wait(timeout=2)
-        except Exception:
-            proc.kill()
+        conn.close()
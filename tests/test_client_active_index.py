@@ -0,0 +1,153 @@
+import os
+import struct
+from pathlib import Path
+
+import pytest
+
+from client import cli
+
+
+def _prf(i: int) -> str:
+    return (bytes([i]) * cli._PRF_LEN).hex()
+
+
+def _meta(i: int) -> str:
+    return f"{i:02x}" * 12 + ":" + f"{i:02x}" * 20
+
+
+@pytest.fixture(autouse=True)
+def _fresh_overlay_cache():
+    cli._ACTIVE_CACHE.clear()
+    yield
+    cli._ACTIVE_CACHE.clear()
+
+
+def test_bad_magic_base_is_not_compacted_away(tmp_path: Path):
+    base = tmp_path / "active_index.bin"
+    junk = b"NOTANIDX" + b"\0" * 64
+    base.write_bytes(junk)
+    delta = tmp_path / "active_index.delta"
+    delta.write_text("", encoding="utf-8")
+    with pytest.raises(OSError, match="Unrecognized active index format"):
+        cli._store_active_index(str(tmp_path), "L", "DS", None, [f"+{_prf(1)},aa:bb\n"])
+    # Neither the base nor the pending delta was replaced
+    assert base.read_bytes() == junk
+    assert delta.read_text(encoding="utf-8") == f"+{_prf(1)},aa:bb\n"
+
+
+def test_write_then_lookup_hits_and_misses(tmp_path: Path):
+    path = str(tmp_path / "active_index.bin")
+    active = {_prf(i): _meta(i) for i in (3, 1, 200, 7)}
+    cli._write_active_base(path, active)
+    for prf_h, meta in active.items():
+        assert cli._lookup_active_base(path, bytes.fromhex(prf_h)) == meta
+    for i in (0, 2, 8, 255):
+        assert cli._lookup_active_base(path, bytes.fromhex(_prf(i))) is None
+    assert cli._read_active_base(path) == active
+
+    # An empty set still makes a valid file
+    cli._write_active_base(path, {})
+    assert cli._read_active_base(path) == {}
+    assert cli._lookup_active_base(path, bytes.fromhex(_prf(1))) is None
+
+
+def test_bloom_rejects_absent_prf_and_search_settles_false_positives(tmp_path: Path):
+    member = bytes.fromhex(_prf(9))
+    bloom = cli._build_bloom(member, 1)
+    size = len(bloom)
+    assert cli._bloom_may_contain(bloom, 0, size, member)
+    # Probe words that land on clear bits are rejected without a search
+    clear = [b for b in range(size * 8) if not bloom[b >> 3] & (1 << (b & 7))]
+    probe = struct.pack(f"<{cli._BLOOM_K}I", *clear[:cli._BLOOM_K]) + member[4 * cli._BLOOM_K:]
+    assert not cli._bloom_may_contain(bloom, 0, size, probe)
+
+    # Same filter words as the member, different PRF: the filter passes and
+    # the binary search reports the miss
+    path = str(tmp_path / "active_index.bin")
+    cli._write_active_base(path, {member.hex(): _meta(9)})
+    twin = member[:4 * cli._BLOOM_K] + b"\x00" * (cli._PRF_LEN - 4 * cli._BLOOM_K)
+    assert cli._lookup_active_base(path, probe) is None
+    assert cli._lookup_active_base(path, twin) is None
+    assert cli._lookup_active_base(path, member) == _meta(9)
+
+
+def test_delta_overlay_then_compaction(tmp_path: Path, monkeypatch):
+    out_dir = str(tmp_path)
+    base = tmp_path / "active_index.bin"
+    delta = tmp_path / "active_index.delta"
+    cli._store_active_index(out_dir, "L", "DS", {_prf(i): _meta(i) for i in range(1, 101)}, None)
+    base_bytes = base.read_bytes()
+
+    # A small delta is appended and shadows the untouched base
+    cli._store_active_index(out_dir, "L", "DS", None, [f"-{_prf(1)}\n", f"+{_prf(150)},{_meta(150)}\n"])
+    assert base.read_bytes() == base_bytes and delta.exists()
+    overlay = cli._load_active_overlay(out_dir, "L", "DS")
+    assert overlay == {_prf(1): None, _prf(150): _meta(150)}
+    merged = cli._merge_active_index(out_dir, "L", "DS")
+    assert _prf(1) not in merged and merged[_prf(150)] == _meta(150) and len(merged) == 100
+
+    # Past the ratio the delta is folded into a new base and removed
+    monkeypatch.setattr(cli, "_ACTIVE_COMPACT_RATIO", 0.0)
+    cli._store_active_index(out_dir, "L", "DS", None, [f"+{_prf(151)},{_meta(151)}\n"])
+    assert not delta.exists()
+    compacted = cli._read_active_base(str(base))
+    assert compacted == {**merged, _prf(151): _meta(151)}
+    assert cli._load_active_overlay(out_dir, "L", "DS") == {}
+
+
+@pytest.mark.parametrize("cut", [4, 20, -3], ids=["header", "table", "bloom"])
+def test_truncated_base_raises(tmp_path: Path, cut: int):
+    path = tmp_path / "active_index.bin"
+    cli._write_active_base(str(path), {_prf(i): _meta(i) for i in (1, 2)})
+    data = path.read_bytes()
+    path.write_bytes(data[:cut])
+    with pytest.raises(OSError, match="active index"):
+        cli._read_active_base(str(path))
+    with pytest.raises(OSError, match="active index"):
+        cli._lookup_active_base(str(path), bytes.fromhex(_prf(2)))
+    with pytest.raises(OSError):
+        cli._merge_active_index(str(tmp_path), "L", "DS")
+
+
+def test_reads_version_1_base(tmp_path: Path):
+    active = {_prf(i): _meta(i) for i in (5, 2, 9)}
+    keys = sorted(active)
+    metas = [active[k].encode("ascii") for k in keys]
+    offsets = [0]
+    for meta in metas:
+        offsets.append(offsets[-1] + len(meta))
+    path = tmp_path / "active_index.bin"
+    path.write_bytes(
+        cli._ACTIVE_HEADER_V1.pack(cli._ACTIVE_MAGIC_V1, len(keys))
+        + bytes.fromhex("".join(keys))
+        + struct.pack(f"<{len(offsets)}Q", *offsets)
+        + b"".join(metas)
+    )
+    assert cli._read_active_base(str(path)) == active
+    for k, meta in active.items():
+        assert cli._lookup_active_base(str(path), bytes.fromhex(k)) == meta
+    assert cli._lookup_active_base(str(path), bytes.fromhex(_prf(3))) is None
+
+    # The next compaction rewrites it in the current format
+    cli._store_active_index(str(tmp_path), "L", "DS", cli._merge_active_index(str(tmp_path), "L", "DS"), None)
+    assert path.read_bytes()[:8] == cli._ACTIVE_MAGIC
+    assert cli._read_active_base(str(path)) == active
+
+
+def test_missing_base_is_rebuilt_from_changes_log_and_legacy_csv_removed(tmp_path: Path, monkeypatch):
+    monkeypatch.setattr(cli, "_DATA_DIR", str(tmp_path))
+    monkeypatch.setattr(cli, "_DATASET_DIRS", {})
+    out_dir = tmp_path / "L" / "DS"
+    out_dir.mkdir(parents=True)
+    (out_dir / "changes.log").write_text(
+        f"ADDED {_prf(1)} {_meta(1)} H1\n"
+        f"ADDED {_prf(2)} {_meta(2)} H2\n"
+        f"REMOVED {_prf(1)} - H3\n",
+        encoding="utf-8",
+    )
+    legacy = out_dir / "active_index.csv"
+    legacy.write_text(f"{_prf(1)},{_meta(1)}\n", encoding="utf-8")
+
+    assert cli._find_active("L", "DS", bytes.fromhex(_prf(2))) == _meta(2)
+    assert cli._find_active("L", "DS", bytes.fromhex(_prf(1))) is None
+    assert sorted(os.listdir(out_dir)) == ["active_index.bin", "changes.log"]
@@ -0,0 +1,18 @@
+import pytest
+
+from shared import compress_tools
+
+
+def test_decompress_round_trip_within_limit():
+    data = b"ADDED " + b"ab" * 4096 + b"\n"
+    packed = compress_tools.compress(data, "gzip")
+    assert compress_tools.decompress(packed, "gzip", max_size=len(data)) == data
+    assert compress_tools.decompress(data, None, max_size=1) == data
+
+
+def test_decompress_refuses_oversized_or_malformed_body():
+    packed = compress_tools.compress(b"\0" * (1 << 20), "gzip")
+    with pytest.raises(ValueError, match="exceeds"):
+        compress_tools.decompress(packed, "gzip", max_size=(1 << 20) - 1)
+    with pytest.raises(ValueError, match="Malformed"):
+        compress_tools.decompress(packed[:-4], "gzip", max_size=1 << 21)
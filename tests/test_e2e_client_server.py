@@ -1,26 +1,24 @@
 import json
-import os
-import subprocess
 from pathlib import Path
 
 import pytest
 
-from .utils import run_module, wait_for_port, pick_free_port
+from .utils import has_libsodium, run_module
+
+pytestmark = pytest.mark.skipif(not has_libsodium(), reason="libsodium not available")
 
 
 def write_source(path: Path, lines: list[tuple[str, str]]):
-    with open(path, "w", encoding="utf-8") as f:
-        for ioc, meta in lines:
-            f.write(f"{ioc},{meta}\n")
+    path.write_text("".join(f"{ioc},{meta}\n" for ioc, meta in lines), encoding="utf-8")
 
 
 def _label(host: str, port: int) -> str:
     return f"{host}_{port}"
 
 
-def test_end_to_end_client_server_sync_and_query(workspace: Path, pyexe: str, libsodium_available: bool):
-    if not libsodium_available:
-        pytest.skip("libsodium not available")
+def test_end_to_end_client_server_sync_and_query(server_workspace: Path, server_pyexe: str, running_server):
+    workspace, pyexe = server_workspace, server_pyexe
+    host, port, bind = running_server
 
     ds = "E2E1"
     # Create dataset and initial source
@@ -33,47 +31,40 @@ def test_end_to_end_client_server_sync_and_query(workspace: Path, pyexe: str, li
     r1 = run_module(pyexe, "server.cli", ["sync", ds, str(src)], workspace)
     assert r1.returncode == 0, r1.stderr
 
-    # Start server
-    port = pick_free_port()
-    host = "127.0.0.1"
-    bind = f"{host}:{port}"
-    env = os.environ.copy()
-    env["PYTHONPATH"] = str(workspace)
-    proc = subprocess.Popen([pyexe, "-m", "server.cli", "start_server", bind], cwd=workspace, env=env)
-    try:
-        wait_for_port(host, port, timeout=5)
-
-        # Client full sync
-        r2 = run_module(pyexe, "client.cli", ["sync_data", bind, ds], workspace)
-        assert r2.returncode == 0, r2.stderr
-        label = _label(host, port)
-        client_dir = workspace / "client" / "data" / label / ds
-        assert (client_dir / "changes.log").exists()
-
-        # Update server source: remove ioc_beta, add ioc_gamma
-        meta3 = json.dumps({"desc": "gamma"})
-        write_source(src, [("ioc_alpha", meta1), ("ioc_gamma", meta3)])
-        r3 = run_module(pyexe, "server.cli", ["sync", ds, str(src)], workspace)
-        assert r3.returncode == 0, r3.stderr
-
-        # Client delta sync
-        r4 = run_module(pyexe, "client.cli", ["sync_data", bind, ds], workspace)
-        assert r4.returncode == 0, r4.stderr
-
-        # Client query for ioc_alpha should succeed and print metadata
-        r5 = run_module(pyexe, "client.cli", ["query", bind, ds, "ioc_alpha"], workspace)
-        assert r5.returncode == 0, r5.stderr
-        assert "Match found." in r5.stdout
-        assert "Metadata:" in r5.stdout and "alpha" in r5.stdout
-
-        # Client query for removed ioc_beta should return no match
-        r6 = run_module(pyexe, "client.cli", ["query", bind, ds, "ioc_beta"], workspace)
-        assert r6.returncode == 0
-        assert "No active match" in r6.stdout
-    finally:
-        proc.terminate()
-        try:
-            proc.wait(timeout=2)
-        except Exception:
-            proc.kill()
-
+    # Client full sync
+    r2 = run_module(pyexe, "client.cli", ["sync_data", bind, ds], workspace)
+    assert r2.returncode == 0, r2.stderr
+    label = _label(host, port)
+    client_dir = workspace / "client" / "data" / label / ds
+    assert (client_dir / "changes.log").exists()
+
+    # Update server source: remove ioc_beta, add ioc_gamma
+    meta3 = json.dumps({"desc": "gamma"})
+    write_source(src, [("ioc_alpha", meta1), ("ioc_gamma", meta3)])
+    r3 = run_module(pyexe, "server.cli", ["sync", ds, str(src)], workspace)
+    assert r3.returncode == 0, r3.stderr
+
+    # Client delta sync
+    r4 = run_module(pyexe, "client.cli", ["sync_data", bind, ds], workspace)
+    assert r4.returncode == 0, r4.stderr
+
+    # Client query for ioc_alpha should succeed and print metadata
+    r5 = run_module(pyexe, "client.cli", ["query", bind, ds, "ioc_alpha"], workspace)
+    assert r5.returncode == 0, r5.stderr
+    assert "Match found." in r5.stdout
+    assert "Metadata:" in r5.stdout and "alpha" in r5.stdout
+
+    # Client query for removed ioc_beta should return no match
+    r6 = run_module(pyexe, "client.cli", ["query", bind, ds, "ioc_beta"], workspace)
+    assert r6.returncode == 0
+    assert "No active match" in r6.stdout
+
+    # Batch query evaluates all IOCs in one round-trip
+    iocs = workspace / "iocs.txt"
+    iocs.write_text("ioc_alpha\nioc_beta\n\nioc_gamma\n", encoding="utf-8")
+    r7 = run_module(pyexe, "client.cli", ["query_batch", bind, ds, str(iocs)], workspace)
+    assert r7.returncode == 0, r7.stderr
+    out = r7.stdout.splitlines()
+    assert any(ln.startswith("ioc_alpha: match") and "alpha" in ln for ln in out)
+    assert "ioc_beta: no active match" in out
+    assert any(ln.startswith("ioc_gamma: match") and "gamma" in ln for ln in out)
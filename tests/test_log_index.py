@@ -0,0 +1,33 @@
+from pathlib import Path
+
+from server.api_server import _LogIndex
+
+
+def test_extend_indexes_complete_lines_only(tmp_path: Path):
+    log = tmp_path / "changes.log"
+    log.write_bytes(b"ADDED a - H1\nADDED b - H2\nADDED c - H")
+    with open(log, "rb") as f:
+        idx = _LogIndex(0)
+        idx.extend(f)
+    assert idx.offsets == {"H1": 13, "H2": 26}
+    assert idx.last_hash == "H2" and idx.end == 26
+    assert idx.tail == b"ADDED b - H2\n"
+
+
+def test_extend_survives_empty_and_truncated_log(tmp_path: Path):
+    log = tmp_path / "changes.log"
+    log.write_bytes(b"")
+    with open(log, "rb") as f:
+        idx = _LogIndex(0)
+        idx.extend(f)
+        assert idx.end == 0 and idx.last_hash is None
+
+    log.write_bytes(b"ADDED a - H1\n")
+    with open(log, "rb") as f:
+        idx.extend(f)
+        assert idx.last_hash == "H1"
+        # Rekey truncates in place; a scan past the new EOF just reads nothing
+        with open(log, "r+b") as w:
+            w.truncate(0)
+        idx.extend(f)
+        assert idx.end == 13 and idx.last_hash == "H1"
@@ -1,8 +1,11 @@
+import argparse
 import os
 from pathlib import Path
 
 import pytest
 
+from server.cli import _write_atomic, data_name_type
+
 from .utils import run_module
 
 
@@ -30,8 +33,13 @@ def test_create_and_remove_source_classic(workspace: Path, pyexe: str):
 
 
 @pytest.mark.parametrize("bad", ["with-dash", "space x", "sym$"], ids=["dash","space","symbol"])
-def test_create_source_rejects_bad_data_name(workspace: Path, pyexe: str, bad: str):
-    r = run_module(pyexe, "server.cli", ["create_source", bad], workspace)
+def test_data_name_type_rejects_bad_names(bad: str):
+    with pytest.raises(argparse.ArgumentTypeError, match="alphanumeric"):
+        data_name_type(bad)
+
+
+def test_create_source_rejects_bad_data_name(workspace: Path, pyexe: str):
+    r = run_module(pyexe, "server.cli", ["create_source", "with-dash"], workspace)
     assert r.returncode != 0
     assert "alphanumeric" in (r.stderr + r.stdout)
 
@@ -54,3 +62,25 @@ def test_create_source_ot_placeholder(workspace: Path, pyexe: str):
     key = workspace / "server" / "secrets" / ds / "private.key"
     assert key.exists()
     assert key.read_bytes().startswith(b"ot-placeholder-key")
+
+
+def test_write_atomic_ignores_stale_temp_and_sets_mode(tmp_path: Path):
+    key = tmp_path / "private.key"
+    # A leftover from an older writer must not lend its mode to the new file
+    stale = tmp_path / "private.key.tmp"
+    stale.write_bytes(b"old")
+    stale.chmod(0o644)
+    _write_atomic(str(key), b"secret", 0o600)
+    assert key.read_bytes() == b"secret"
+    assert key.stat().st_mode & 0o777 == 0o600
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["private.key", "private.key.tmp"]
+
+
+def test_write_atomic_removes_temp_on_failure(tmp_path: Path):
+    # Renaming a file over a non-empty directory fails after the data is written
+    target = tmp_path / "schema.json"
+    target.mkdir()
+    (target / "keep").write_bytes(b"")
+    with pytest.raises(OSError):
+        _write_atomic(str(target), b"{}\n")
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["schema.json"]
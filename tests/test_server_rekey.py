@@ -1,20 +1,18 @@
+import hashlib
 from pathlib import Path
-import csv
 
 import pytest
 
-from .utils import run_module
+from .utils import has_libsodium, run_module
+
+pytestmark = pytest.mark.skipif(not has_libsodium(), reason="libsodium not available")
 
 
 def write_source(path: Path, lines: list[tuple[str, str]]):
-    with open(path, "w", encoding="utf-8") as f:
-        for ioc, meta in lines:
-            f.write(f"{ioc},{meta}\n")
+    path.write_text("".join(f"{ioc},{meta}\n" for ioc, meta in lines), encoding="utf-8")
 
 
-def test_rekey_resets_changes_and_updates_index(workspace: Path, pyexe: str, libsodium_available: bool):
-    if not libsodium_available:
-        pytest.skip("libsodium not available")
+def test_rekey_resets_changes_and_updates_index(workspace: Path, pyexe: str):
     ds = "RK1"
     r = run_module(pyexe, "server.cli", ["create_source", ds], workspace)
     assert r.returncode == 0, r.stderr
@@ -27,7 +25,7 @@ def test_rekey_resets_changes_and_updates_index(workspace: Path, pyexe: str, lib
     idx = out_dir / "index.csv"
     key_path = workspace / "server" / "secrets" / ds / "private.key"
     key_before = key_path.read_bytes()
-    rows_before = list(csv.reader(open(idx, newline="", encoding="utf-8")))
+    rows_before = [ln.split(",") for ln in idx.read_text(encoding="utf-8").splitlines() if ln]
     prfs_before = {r[0]: r[1] for r in rows_before}
 
     # Rekey
@@ -35,12 +33,63 @@ def test_rekey_resets_changes_and_updates_index(workspace: Path, pyexe: str, lib
     assert r2.returncode == 0, r2.stderr
     key_after = key_path.read_bytes()
     assert key_before != key_after
-    rows_after = list(csv.reader(open(idx, newline="", encoding="utf-8")))
+    rows_after = [ln.split(",") for ln in idx.read_text(encoding="utf-8").splitlines() if ln]
     prfs_after = {r[0]: r[1] for r in rows_after}
     # PRFs should change on rekey
     assert any(prfs_before[k] != prfs_after[k] for k in prfs_before.keys())
     # changes.log should contain only ADDED entries (2 lines)
     log = out_dir / "changes.log"
-    lines = [ln.strip() for ln in open(log, encoding="utf-8")] 
+    lines = log.read_text(encoding="utf-8").splitlines()
     assert len(lines) >= 2
     assert all(ln.startswith("ADDED ") for ln in lines)
+
+
+def test_failed_rekey_keeps_log_and_leaves_no_temp_files(workspace: Path, pyexe: str):
+    ds = "RK2"
+    r = run_module(pyexe, "server.cli", ["create_source", ds], workspace)
+    assert r.returncode == 0, r.stderr
+    src = workspace / "src2.txt"
+    write_source(src, [("ioc1","{\"x\":1}"), ("ioc2","{\"y\":2}")])
+    r1 = run_module(pyexe, "server.cli", ["sync", ds, str(src)], workspace)
+    assert r1.returncode == 0, r1.stderr
+    out_dir = workspace / "server" / "data" / ds
+    log = out_dir / "changes.log"
+    log_before = log.read_bytes()
+    key_path = workspace / "server" / "secrets" / ds / "private.key"
+    key_before = key_path.read_bytes()
+
+    # A missing source is reported before anything is rewritten
+    r_missing = run_module(pyexe, "server.cli", ["rekey", ds, str(workspace / "nope.txt")], workspace)
+    assert r_missing.returncode == 1
+    assert key_path.read_bytes() == key_before
+
+    # A directory in place of index.csv makes the index swap fail
+    idx = out_dir / "index.csv"
+    idx.unlink()
+    idx.mkdir()
+    r2 = run_module(pyexe, "server.cli", ["rekey", ds, str(src)], workspace)
+    assert r2.returncode == 1
+    assert "Failed to rewrite index/change log" in r2.stderr
+    assert log.read_bytes() == log_before
+    # The served key must still match the PRFs in the untouched index and log
+    assert key_path.read_bytes() == key_before
+    assert not (out_dir / "index.csv.tmp").exists()
+    assert not (out_dir / "changes.log.tmp").exists()
+
+    # After a successful rekey the next sync chains onto the rewritten log
+    idx.rmdir()
+    r3 = run_module(pyexe, "server.cli", ["rekey", ds, str(src)], workspace)
+    assert r3.returncode == 0, r3.stderr
+    assert key_path.read_bytes() != key_before
+    assert key_path.stat().st_mode & 0o777 == 0o600
+    assert sorted(p.name for p in key_path.parent.iterdir()) == ["private.key"]
+    write_source(src, [("ioc1","{\"x\":1}"), ("ioc2","{\"y\":2}"), ("ioc3","{\"z\":3}")])
+    r4 = run_module(pyexe, "server.cli", ["sync", ds, str(src)], workspace)
+    assert r4.returncode == 0, r4.stderr
+    lines = log.read_text(encoding="utf-8").splitlines()
+    assert len(lines) == 3
+    prev = b"\x00" * 64
+    for ln in lines:
+        ev, prf, meta, h = ln.split()
+        prev = hashlib.sha512(b"|".join((prev, ev.encode(), prf.encode(), meta.encode()))).digest()
+        assert h == prev.hex()
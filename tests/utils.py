@@ -1,28 +1,95 @@
+import contextlib
+import functools
+import importlib
+import io
 import os
 import socket
 import subprocess
+import sys
+import traceback
 from pathlib import Path
 
+# Run server.cli / client.cli inside the pytest process instead of spawning
+# an interpreter per call; ``pytest --subprocess-cli`` turns this off.
+IN_PROCESS_CLI = True
+_IN_PROCESS_MODULES = ("server.cli", "client.cli")
+_WORKSPACE_PACKAGES = ("server", "client", "shared")
+
 
 def run_module(py: str, mod: str, args: list[str], cwd: Path) -> subprocess.CompletedProcess:
+    if IN_PROCESS_CLI and mod in _IN_PROCESS_MODULES:
+        return run_cli(mod, args, cwd)
     env = os.environ.copy()
     env["PYTHONPATH"] = str(cwd)
     cmd = [py, "-m", mod, *args]
     return subprocess.run(cmd, cwd=cwd, capture_output=True, text=True, env=env)
 
 
+def _forget_workspace_modules() -> None:
+    for name in [n for n in sys.modules if n.partition(".")[0] in _WORKSPACE_PACKAGES]:
+        del sys.modules[name]
+
+
+def run_cli(mod: str, args: list[str], cwd: Path) -> subprocess.CompletedProcess:
+    """Equivalent of ``python -m <mod> <args>`` run in-process from ``cwd``.
+
+    The workspace packages are imported fresh for every call, since their
+    data paths are derived from ``__file__`` and each test has its own copy.
+    """
+    out, err = io.StringIO(), io.StringIO()
+    root = str(cwd)
+    _forget_workspace_modules()
+    sys.path.insert(0, root)
+    try:
+        with contextlib.chdir(cwd), contextlib.redirect_stdout(out), contextlib.redirect_stderr(err):
+            try:
+                rc = importlib.import_module(mod).main(list(args))
+            except SystemExit as e:
+                rc = e.code
+            except Exception:
+                traceback.print_exc()
+                rc = 1
+            if rc is not None and not isinstance(rc, int):
+                print(rc, file=sys.stderr)
+                rc = 1
+    finally:
+        sys.path.remove(root)
+        _forget_workspace_modules()
+    return subprocess.CompletedProcess([mod, *args], rc or 0, out.getvalue(), err.getvalue())
+
+
+@functools.lru_cache(maxsize=None)
+def has_libsodium() -> bool:
+    """Whether shared.crypto_tools can load libsodium; probed once per process."""
+    root = str(Path(__file__).resolve().parents[1])
+    _forget_workspace_modules()
+    sys.path.insert(0, root)
+    try:
+        importlib.import_module("shared.crypto_tools")._load_libsodium()
+        return True
+    except Exception:
+        return False
+    finally:
+        sys.path.remove(root)
+        _forget_workspace_modules()
+
+
 def wait_for_port(host: str, port: int, timeout: float = 5.0) -> None:
     import time
 
-    deadline = time.time() + timeout
-    while time.time() < deadline:
+    deadline = time.monotonic() + timeout
+    delay = 0.001
+    while True:
         with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
             s.settimeout(0.25)
-            try:
-                s.connect((host, port))
+            if s.connect_ex((host, port)) == 0:
                 return
-            except OSError:
-                time.sleep(0.05)
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        # Back off from 1ms so a server that is already up costs almost nothing
+        time.sleep(min(delay, remaining))
+        delay = min(delay * 2, 0.05)
     raise RuntimeError(f"Server {host}:{port} not reachable within {timeout}s")
 
 